@@ -0,0 +1,248 @@
+# Command-line analysis of large expression files
+# Memory-maps the input and analyzes it one line at a time: lines are found
+# with mmap.find() and sliced out of a memoryview of the mapping without
+# copying, so only the decoded text of the current line is held in memory.
+# With several workers the file is split at newline boundaries and every
+# worker process maps and analyzes its own byte range. With --store, results
+# are kept in a ResultStore and the file is a batch that resumes after its
+# last committed line when run again.
+# Run with: python analyze_file.py FILE [--format ndjson] [--output PATH] [--workers 4]
+#           python analyze_file.py FILE --store results.db [--batch-id ID]
+
+import argparse
+import json
+import mmap
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from json_stream import encode_analysis
+from lexical_analyzer import DEFAULT_SECTIONS, LEXERS, PARSERS, SECTIONS, recognize, run_analysis
+from result_store import ResultStore
+
+
+def split_ranges(buffer, parts):
+    """Return (start, stop) byte ranges of buffer that end at newlines
+    
+    The buffer is cut into at most parts ranges of about equal size; every
+    cut is moved forward to just after the next newline, so no line is split.
+    """
+    size = len(buffer)
+    bounds = [0]
+    for i in range(1, parts):
+        newline = buffer.find(b'\n', max(bounds[-1], size * i // parts))
+        if newline == -1:
+            break
+        bounds.append(newline + 1)
+    bounds.append(size)
+    return [(start, stop) for start, stop in zip(bounds, bounds[1:]) if start < stop]
+
+
+def iter_line_offsets(buffer, start, stop):
+    """Yield (offset after the line, line) for the non-blank lines of
+    buffer[start:stop], stripped"""
+    view = memoryview(buffer)
+    try:
+        while start < stop:
+            end = buffer.find(b'\n', start, stop)
+            if end == -1:
+                end = stop
+            # Slicing the memoryview does not copy; decoding is the only copy
+            expression = str(view[start:end], 'utf-8').strip()
+            start = min(end + 1, stop)
+            if expression:
+                yield start, expression
+    finally:
+        view.release()
+
+
+def iter_lines(buffer, start, stop):
+    """Yield the lines of iter_line_offsets() without their offsets"""
+    for _, expression in iter_line_offsets(buffer, start, stop):
+        yield expression
+
+
+def analyze_range(path, start, stop, output, options):
+    """Analyze the lines in a byte range of a file
+    
+    Writes one NDJSON result per line to output when it is not None and
+    returns the counts of analyzed and accepted expressions. Without output
+    only acceptance is computed.
+    """
+    lexer, parser, sections, validate = options
+    if output is None:
+        sections = ()
+    expressions = 0
+    accepted = 0
+    with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        for expression in iter_lines(buffer, start, stop):
+            expressions += 1
+            if validate:
+                is_accepted = recognize(expression)
+                if output is not None:
+                    output.write(json.dumps({'input': expression, 'is_accepted': is_accepted},
+                                            separators=(',', ':')) + '\n')
+            else:
+                analysis = run_analysis(expression, lexer, parser, sections)
+                is_accepted = analysis.is_accepted
+                if output is not None:
+                    output.write(encode_analysis(analysis) + '\n')
+            accepted += is_accepted
+    return expressions, accepted
+
+
+def _analyze_part(task):
+    path, start, stop, part_path, options = task
+    if part_path is None:
+        return analyze_range(path, start, stop, None, options)
+    with open(part_path, 'w', encoding='utf-8') as output:
+        return analyze_range(path, start, stop, output, options)
+
+
+def analyze_file(path, output=None, workers=1, options=('scalar', 'iterative', DEFAULT_SECTIONS, False)):
+    """Analyze every line of a file and return (expressions, accepted)
+    
+    options is (lexer, parser, sections, validate); validate only checks
+    acceptance with recognize(). NDJSON results are written to output in
+    file order when it is not None. With more than one worker, each worker
+    process writes its results to a temporary file and the files are
+    copied to output in order.
+    """
+    with open(path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return 0, 0
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            ranges = split_ranges(buffer, workers)
+    
+    if len(ranges) == 1:
+        start, stop = ranges[0]
+        return analyze_range(path, start, stop, output, options)
+    
+    from multiprocessing import Pool
+    
+    with tempfile.TemporaryDirectory() as directory:
+        parts = [os.path.join(directory, f'part{i}.ndjson') if output is not None else None
+                 for i in range(len(ranges))]
+        tasks = [(path, start, stop, part, options) for (start, stop), part in zip(ranges, parts)]
+        with Pool(len(tasks)) as pool:
+            counts = pool.map(_analyze_part, tasks)
+        
+        if output is not None:
+            for part in parts:
+                with open(part, encoding='utf-8') as file:
+                    shutil.copyfileobj(file, output)
+    
+    return sum(count[0] for count in counts), sum(count[1] for count in counts)
+
+
+def analyze_stored(path, store, batch_id, output=None):
+    """Analyze a file as a resumable batch of a ResultStore
+    
+    A batch that was started before continues from the offset after its
+    last committed line, and the results of the committed lines are copied
+    from the store to output. Expressions that are already in the store are
+    not analyzed again. Returns (expressions, accepted, resumed), where
+    resumed counts the lines of earlier runs.
+    """
+    progress = store.start_batch(batch_id)
+    resumed = progress['lines']
+    expressions = 0
+    accepted = 0
+    for result, is_accepted in store.batch_results(batch_id, stop=resumed):
+        expressions += 1
+        accepted += is_accepted
+        if output is not None:
+            output.write(result.decode('utf-8') + '\n')
+    if progress['done']:
+        return expressions, accepted, resumed
+    
+    with open(path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return expressions, accepted, resumed
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            items = iter_line_offsets(buffer, progress['next_offset'] or 0, len(buffer))
+            for result, is_accepted in store.run_batch(batch_id, items):
+                expressions += 1
+                accepted += is_accepted
+                if output is not None:
+                    output.write(result.decode('utf-8') + '\n')
+    return expressions, accepted, resumed
+
+
+def parse_sections(value):
+    """Return the sections of a comma-separated list, see SECTIONS"""
+    names = {name.strip() for name in value.split(',') if name.strip()}
+    unknown = names - set(SECTIONS) - {'accept'}
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown sections: {', '.join(sorted(unknown))}")
+    return tuple(name for name in SECTIONS if name in names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Analyze a file of expressions, one per line')
+    parser.add_argument('file', help='expression file to analyze')
+    parser.add_argument('--format', choices=['summary', 'ndjson'], default='summary',
+                        help='write a JSON summary, or one JSON result per line (default: summary)')
+    parser.add_argument('--output', help='file to write to instead of standard output')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='worker processes, each analyzing a part of the file; 0 means one per CPU')
+    parser.add_argument('--lexer', choices=sorted(LEXERS), default='scalar')
+    parser.add_argument('--parser', choices=sorted(PARSERS), default='iterative')
+    parser.add_argument('--recover', action='store_true', help='report every error, same as --parser recovering')
+    parser.add_argument('--sections', type=parse_sections, default=DEFAULT_SECTIONS,
+                        help=f"comma-separated result sections from {', '.join(SECTIONS)} or accept")
+    parser.add_argument('--validate', action='store_true',
+                        help='only check acceptance, without tokens, trees or errors')
+    parser.add_argument('--store', help='SQLite result store; the run resumes an interrupted batch')
+    parser.add_argument('--batch-id', help='batch of the store to run or resume (default: the file path and size)')
+    args = parser.parse_args()
+    if args.store and (args.validate or args.workers != 1):
+        parser.error('--store analyzes with one worker and cannot be combined with --validate')
+    
+    options = (args.lexer, 'recovering' if args.recover else args.parser, args.sections, args.validate)
+    workers = args.workers or os.cpu_count() or 1
+    size = os.path.getsize(args.file)
+    
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    store = ResultStore(args.store, options[1], args.sections) if args.store else None
+    try:
+        start = time.perf_counter()
+        if store is not None:
+            batch_id = args.batch_id or f'{os.path.abspath(args.file)}:{size}'
+            expressions, accepted, resumed = analyze_stored(
+                args.file, store, batch_id, output if args.format == 'ndjson' else None)
+        else:
+            expressions, accepted = analyze_file(args.file, output if args.format == 'ndjson' else None,
+                                                 workers, options)
+        elapsed = time.perf_counter() - start
+        
+        summary = {
+            'file': args.file,
+            'bytes': size,
+            'expressions': expressions,
+            'accepted': accepted,
+            'rejected': expressions - accepted,
+            'seconds': round(elapsed, 3),
+            'mb_per_second': round(size / 2 ** 20 / elapsed, 2) if elapsed else None
+        }
+        if store is not None:
+            summary['batch_id'] = batch_id
+            summary['resumed'] = resumed
+        if args.format == 'summary':
+            output.write(json.dumps(summary, indent=2) + '\n')
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        if store is not None:
+            store.close()
+    
+    # Throughput goes to standard error, so that NDJSON output stays clean
+    print(f"{expressions} expressions, {size / 2 ** 20:.1f} MB in {elapsed:.2f} s: "
+          f"{summary['mb_per_second']} MB/s, {expressions / elapsed if elapsed else 0:.0f} expressions/s",
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
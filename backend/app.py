@@ -1,14 +1,335 @@
+import codecs
 import json
 import os
+import shutil
+import tempfile
+from contextlib import nullcontext
+from itertools import islice
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, abort, jsonify, request, stream_with_context
 from flask_cors import CORS
 
-from lexical_analyzer import analyze_expression
+from batch import analyze_batch, analyze_unique
+from cache import ResultCache, analysis_dict, analysis_json
+from incremental import DocumentStore
+import instrumentation
+from json_stream import (encode_analysis, stream_analysis, stream_batch, stream_encoded_results,
+                         stream_ndjson, stream_results)
+from push_analysis import PushAnalyzer
+from lexical_analyzer import (DEFAULT_SECTIONS, LEXERS, PARSERS, SECTIONS, Analysis, recognize,
+                              run_analysis)
+from worker_pool import PoolFull
+from tree_store import TreeStore, tree_slice
 
 app = Flask(__name__)
 CORS(app)  # Enable Cross-Origin Resource Sharing
 
+# Process pool settings for file uploads; 0 workers means one per CPU
+app.config['BATCH_WORKERS'] = int(os.environ.get('BATCH_WORKERS', 0))
+app.config['BATCH_CHUNK_SIZE'] = int(os.environ.get('BATCH_CHUNK_SIZE', 256))
+
+# Bytes read from the request body per PushAnalyzer chunk
+app.config['STREAM_CHUNK_BYTES'] = int(os.environ.get('STREAM_CHUNK_BYTES', 64 * 1024))
+
+# Request size limits: larger bodies and expressions are refused with 413.
+# File uploads analyzed as a stream only limit each line, up to the
+# MAX_UPLOAD_BYTES that serving.py lets waitress receive.
+app.config['MAX_REQUEST_BYTES'] = int(os.environ.get('MAX_REQUEST_BYTES', 256 * 2 ** 20))
+app.config['MAX_UPLOAD_BYTES'] = int(os.environ.get('MAX_UPLOAD_BYTES', 16 * 2 ** 30))
+app.config['MAX_EXPRESSION_LENGTH'] = int(os.environ.get('MAX_EXPRESSION_LENGTH', 2 ** 20))
+app.config['MAX_BATCH_ITEMS'] = int(os.environ.get('MAX_BATCH_ITEMS', 100000))
+
+# Streamed uploads are copied for the response to read; larger copies
+# than this are spooled to a temporary file
+app.config['UPLOAD_SPOOL_BYTES'] = int(os.environ.get('UPLOAD_SPOOL_BYTES', 2 ** 20))
+
+# Set where requests may reach different server instances, as on Vercel.
+# Endpoints whose state lives in the memory or disk of one instance then
+# answer 501, and ?tree_depth= is ignored so the whole tree is returned.
+app.config['STATELESS'] = os.environ.get('STATELESS', '').lower() in ('1', 'true', 'yes')
+
+# Most parse tree nodes and levels returned by one /api/trees slice
+app.config['MAX_TREE_SLICE_NODES'] = int(os.environ.get('MAX_TREE_SLICE_NODES', 2000))
+app.config['MAX_TREE_SLICE_DEPTH'] = int(os.environ.get('MAX_TREE_SLICE_DEPTH', 200))
+
+EXAMPLES = [
+    "3+4*5",
+    "a+b*c",
+    "x*(y+z)",
+    "(a+b)*c",
+    "1+2+3+4",
+    "1*2*3*4"
+]
+
+# Cache of /api/analyze results; RESULT_CACHE_ENTRIES=0 disables it
+result_cache = ResultCache(
+    max_entries=int(os.environ.get('RESULT_CACHE_ENTRIES', 1024)),
+    max_bytes=int(os.environ.get('RESULT_CACHE_BYTES', 64 * 2 ** 20)),
+    ttl=float(os.environ['RESULT_CACHE_TTL']) if os.environ.get('RESULT_CACHE_TTL') else None,
+    cache_json=os.environ.get('RESULT_CACHE_JSON', 'true').lower() in ('1', 'true', 'yes')
+)
+
+# Per-stage timings of every analysis, off unless INSTRUMENTATION is set;
+# INSTRUMENTATION=memory also records allocated bytes, at a large slowdown
+if os.environ.get('INSTRUMENTATION', '').lower() in ('1', 'true', 'yes', 'memory'):
+    instrumentation.enable(trace_memory=os.environ['INSTRUMENTATION'].lower() == 'memory')
+
+# Documents kept for incremental re-analysis
+documents = DocumentStore(max_documents=int(os.environ.get('MAX_DOCUMENTS', 256)))
+
+# Parse trees of ?tree_depth= analyses, fetched in slices from /api/trees
+tree_store = TreeStore(max_trees=int(os.environ.get('MAX_TREES', 256)),
+                       max_nodes=int(os.environ.get('MAX_TREE_NODES', 2 ** 22)))
+
+# Persistent results and resumable /api/analyze-file batches, kept when
+# RESULT_STORE names a SQLite file; sqlite3 is only imported then
+result_store = None
+if os.environ.get('RESULT_STORE'):
+    from result_store import ResultStore
+    result_store = ResultStore(os.environ['RESULT_STORE'])
+
+# Bounded WorkerPool that the analysis endpoints run on, installed by
+# serving.py; the development server analyzes in the request thread
+analysis_pool = None
+
+def offload(func, *args):
+    """Return func(*args), computed on the analysis pool when there is one"""
+    if analysis_pool is None:
+        return func(*args)
+    return analysis_pool.run(func, *args)
+
+def reserved():
+    """Context manager that holds an analysis pool slot while the request
+    thread analyzes, or raises PoolFull
+    
+    For work that cannot move to a pool worker: streamed results, documents
+    kept in this process, batches with their own process pool, and analyses
+    whose Analysis object is used here.
+    """
+    if analysis_pool is None:
+        return nullcontext()
+    return analysis_pool.reserve()
+
+def reserved_response(make_chunks, mimetype):
+    """Return a streamed Response of the chunks make_chunks() returns
+    
+    The chunks are analyzed while they are sent, so an analysis pool slot is
+    taken before make_chunks() is called and held until the response is
+    closed.
+    """
+    if analysis_pool is None:
+        return Response(stream_with_context(make_chunks()), mimetype=mimetype)
+    analysis_pool.acquire()
+    try:
+        response = Response(stream_with_context(make_chunks()), mimetype=mimetype)
+    except BaseException:
+        analysis_pool.release(completed=False)
+        raise
+    response.call_on_close(analysis_pool.release)
+    return response
+
+@app.errorhandler(PoolFull)
+def pool_full(e):
+    response = jsonify({'error': str(e)})
+    response.headers['Retry-After'] = '1'
+    return response, 429
+
+@app.errorhandler(400)
+def bad_request(e):
+    return jsonify({'error': e.description}), 400
+
+@app.errorhandler(413)
+def too_large(e):
+    return jsonify({'error': 'Request too large'}), 413
+
+# Endpoints that need state kept between requests, see STATELESS
+STATEFUL_ENDPOINTS = ('create_document', 'get_document', 'edit_document', 'get_tree_node', 'get_batch')
+
+@app.before_request
+def require_state():
+    """Refuse STATEFUL_ENDPOINTS and stored batches when STATELESS is set"""
+    if app.config['STATELESS'] and (request.endpoint in STATEFUL_ENDPOINTS or (
+            request.endpoint == 'analyze_file' and 'batch_id' in request.args)):
+        return jsonify({'error': 'Not available on this deployment, which keeps no state between requests'}), 501
+
+def streams_upload():
+    """Whether the request is a file upload that is analyzed line by line"""
+    return request.endpoint == 'analyze_file' and (
+        request.args.get('format') == 'ndjson' or wants_stream() or 'batch_id' in request.args)
+
+@app.before_request
+def limit_request_size():
+    """Refuse bodies larger than MAX_REQUEST_BYTES, except streamed uploads"""
+    length = request.content_length
+    if length is not None and length > app.config['MAX_REQUEST_BYTES'] and not streams_upload():
+        abort(413)
+
+def expression_too_long(expression):
+    return len(expression) > app.config['MAX_EXPRESSION_LENGTH']
+
+def wants_stream():
+    """Whether the client asked for a streamed response with ?stream=true"""
+    return request.args.get('stream', '').lower() in ('1', 'true', 'yes')
+
+def requested_sections():
+    """The result sections selected with ?sections=tokens,symbols,cst,ast
+    
+    'accept' selects none of them, leaving only acceptance and errors.
+    Without the parameter the full default result is returned.
+    """
+    value = request.args.get('sections')
+    if value is None:
+        return DEFAULT_SECTIONS
+    
+    names = {name.strip() for name in value.split(',') if name.strip()}
+    unknown = names - set(SECTIONS) - {'accept'}
+    if unknown:
+        abort(400, f"Unknown sections: {', '.join(sorted(unknown))}; choose from {', '.join(SECTIONS)} or accept")
+    return tuple(name for name in SECTIONS if name in names)
+
+def parser_name():
+    """The parser selected by the request: ?recover=true reports every
+    syntax error instead of stopping at the first one"""
+    if request.args.get('recover', '').lower() in ('1', 'true', 'yes'):
+        return 'recovering'
+    return 'iterative'
+
+def wants_validation():
+    """Whether the client only asked for acceptance with ?validate=true"""
+    return request.args.get('validate', '').lower() in ('1', 'true', 'yes')
+
+def int_arg(name, default):
+    """The non-negative integer query parameter name, or default"""
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        number = -1
+    if number < 0:
+        abort(400, f"{name} must be a non-negative integer")
+    return number
+
+def wants_timings():
+    """Whether the client asked for per-stage timings with ?timings=true"""
+    return request.args.get('timings', '').lower() in ('1', 'true', 'yes')
+
+def lazy_tree_analysis(expression, parser, sections):
+    """Return the JSON result of expression without a parse tree, and the
+    ParseDag of its tree or None
+    
+    This runs on the analysis pool. The caller stores and slices the tree
+    in the request process, since worker processes have their own
+    tree_store.
+    """
+    lazy_sections = tuple(name for name in SECTIONS
+                          if name != 'cst' and (name in sections or name == 'dag'))
+    analysis = run_analysis(expression, parser=parser, sections=lazy_sections)
+    dag = analysis.dag
+    if 'dag' not in sections:
+        analysis.dag = None
+    return encode_analysis(analysis), dag
+
+def lazy_tree_json(data, dag, depth):
+    """Add the tree_id and the first depth levels of dag to a JSON result
+    
+    The tree is kept in tree_store and the result holds its top levels as
+    parse_tree, see tree_slice(). Returns None when the tree is too large
+    to keep, since the levels left out could not be fetched.
+    """
+    if dag is None:
+        return data
+    tree_id = tree_store.add(dag)
+    if tree_id is None:
+        return None
+    tree = tree_slice(dag, len(dag.nodes) - 1, min(depth, app.config['MAX_TREE_SLICE_DEPTH']),
+                      app.config['MAX_TREE_SLICE_NODES'])
+    # The closing brace of the result is moved after the added fields
+    return (f'{data[:-1]},"tree_id":{json.dumps(tree_id)},'
+            f'"parse_tree":{json.dumps(tree, separators=(",", ":"))}}}')
+
+def compute_json(text):
+    """Return analysis_json(text) computed on the analysis pool, read from
+    and saved to the result store when there is one"""
+    if result_store is None:
+        return offload(analysis_json, text)
+    
+    from result_store import stored_result
+    return result_store.analyze_json(text, lambda text: offload(stored_result, text))
+
+def stored_batch_lines(store, batch_id, progress, expressions):
+    """Yield the NDJSON lines of an uploaded batch of a ResultStore
+    
+    The results of lines committed by earlier uploads of the batch are read
+    from the store and those lines of this upload are skipped; the rest
+    are analyzed and committed by store.run_batch().
+    """
+    for result, _ in store.batch_results(batch_id, stop=progress['lines']):
+        yield result + b'\n'
+    if progress['done']:
+        return
+    
+    remaining = ((None, expression) for expression in islice(expressions, progress['lines'], None))
+    for result, _ in store.run_batch(batch_id, remaining):
+        yield result + b'\n'
+
+def upload_copy(file):
+    """Return a copy of an uploaded file for a streamed response to read
+    
+    Werkzeug closes the uploaded files when the view returns, before a
+    streamed response has read them. The copy is kept in memory up to
+    UPLOAD_SPOOL_BYTES and in a temporary file beyond that; the reader
+    closes it.
+    """
+    copy = tempfile.SpooledTemporaryFile(max_size=app.config['UPLOAD_SPOOL_BYTES'])
+    shutil.copyfileobj(file.stream, copy)
+    copy.seek(0)
+    return copy
+
+def iter_expressions(stream):
+    """Yield the expressions of an upload_copy() one line at a time, and
+    close it when done
+    
+    Lines longer than MAX_EXPRESSION_LENGTH are yielded as None. They are
+    read and dropped in pieces, so a huge line is never held in memory.
+    """
+    limit = app.config['MAX_EXPRESSION_LENGTH']
+    # A character takes at most 4 bytes in UTF-8, and the line ends in \r\n
+    max_bytes = 4 * limit + 2
+    try:
+        while True:
+            line = stream.readline(max_bytes)
+            if not line:
+                return
+            if len(line) == max_bytes and not line.endswith(b'\n'):
+                while line and not line.endswith(b'\n'):
+                    line = stream.readline(max_bytes)
+                yield None
+                continue
+            
+            expression = line.decode('utf-8').strip()
+            if len(expression) > limit:
+                yield None
+            elif expression:
+                yield expression
+    finally:
+        stream.close()
+
+def analyze_lines(stream, parser, sections):
+    """Yield the Analysis of every expression of an upload_copy()
+    
+    A line longer than MAX_EXPRESSION_LENGTH is not analyzed; it gets a
+    rejected Analysis with an empty input and an error instead.
+    """
+    for expression in iter_expressions(stream):
+        if expression is None:
+            analysis = Analysis('', sections)
+            analysis.error = 'Expression too long'
+            yield analysis
+        else:
+            yield run_analysis(expression, parser=parser, sections=sections)
+
 @app.route('/api/analyze', methods=['POST'])
 def analyze():
     data = request.json
@@ -16,10 +337,165 @@ def analyze():
     
     if not expression:
         return jsonify({'error': 'No expression provided'}), 400
+    if expression_too_long(expression):
+        return jsonify({'error': 'Expression too long'}), 413
+    
+    # Validation runs the recognizer, without tokens, tree or error message
+    if wants_validation():
+        return jsonify({'input': expression, 'is_accepted': offload(recognize, expression)})
+    
+    parser = parser_name()
+    sections = requested_sections()
+    if wants_stream():
+        with reserved():
+            analysis = run_analysis(expression, parser=parser, sections=sections)
+        return Response(stream_analysis(analysis), mimetype='application/json')
+    
+    # With ?tree_depth=N only the top of the parse tree is returned, and
+    # its other nodes are fetched from /api/trees when they are expanded
+    tree_depth = int_arg('tree_depth', None)
+    if tree_depth is not None and 'cst' in sections and not app.config['STATELESS']:
+        data, dag = offload(lazy_tree_analysis, expression, parser, sections)
+        data = lazy_tree_json(data, dag, tree_depth)
+        if data is not None:
+            return Response(data, mimetype='application/json')
+        # A tree too large to keep is sent whole, as without ?tree_depth=
+    
+    # Timed requests bypass the cache so that every stage actually runs
+    if wants_timings() and instrumentation.is_enabled():
+        with reserved():
+            analysis = run_analysis(expression, parser=parser, sections=sections)
+            data = encode_analysis(analysis)
+        # The closing brace of the result is moved after the timings
+        return Response(f'{data[:-1]},"timings":{json.dumps(analysis.recorder.to_dict())}}}',
+                        mimetype='application/json')
+    
+    # The cache holds full results of the default parser only
+    if parser != 'iterative' or sections != DEFAULT_SECTIONS:
+        return Response(offload(analysis_json, expression, parser, sections), mimetype='application/json')
+    
+    # Cache hits are served in the request thread, misses by the pool
+    if result_cache.cache_json:
+        data = result_cache.analyze_json(expression, compute_json)
+        return Response(data, mimetype='application/json')
     
-    result = analyze_expression(expression)
+    result = result_cache.analyze(expression, lambda text: offload(analysis_dict, text))
     return jsonify(result)
 
+@app.route('/api/analyze-stream', methods=['POST'])
+def analyze_stream():
+    """Analyze a raw UTF-8 request body while it is being received
+    
+    The body is one expression. It is read and lexed in chunks, and the
+    parser consumes their tokens while later chunks are still arriving.
+    """
+    # The parser thread of a PushAnalyzer cannot move to a pool worker
+    with reserved():
+        analyzer = PushAnalyzer(parser_name(), requested_sections())
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        chunk_size = app.config['STREAM_CHUNK_BYTES']
+        length = 0
+        error = None
+        try:
+            while True:
+                data = request.stream.read(chunk_size)
+                text = decoder.decode(data, final=not data)
+                length += len(text)
+                if length > app.config['MAX_EXPRESSION_LENGTH']:
+                    error = jsonify({'error': 'Expression too long'}), 413
+                    break
+                analyzer.feed(text)
+                if not data:
+                    break
+        except UnicodeDecodeError as e:
+            error = jsonify({'error': f"Body is not valid UTF-8: {e}"}), 400
+        finally:
+            # close() ends the parser thread, which would otherwise wait for
+            # tokens forever when the body was refused or reading it failed,
+            # for example because the client disconnected
+            analysis = analyzer.close()
+    if error is not None:
+        return error
+    if not analysis.text:
+        return jsonify({'error': 'No expression provided'}), 400
+    return Response(stream_analysis(analysis), mimetype='application/json')
+
+def batch_items(body, ndjson, default_parser):
+    """Return the (expression, lexer, parser) items of an /api/analyze-batch body
+    
+    The body is a JSON array, or NDJSON with one item per line. Items are
+    expression strings or objects with an expression and optional lexer,
+    parser or recover options. Raises ValueError for malformed bodies.
+    """
+    if ndjson:
+        values = []
+        for number, line in enumerate(body.decode('utf-8').splitlines(), 1):
+            if line.strip():
+                try:
+                    values.append(json.loads(line))
+                except ValueError as e:
+                    raise ValueError(f"Line {number}: {e}")
+    else:
+        values = json.loads(body)
+        if not isinstance(values, list):
+            raise ValueError("Expected a JSON array of expressions")
+    
+    items = []
+    for index, value in enumerate(values):
+        lexer = 'scalar'
+        parser = default_parser
+        if isinstance(value, dict):
+            expression = value.get('expression')
+            lexer = value.get('lexer', lexer)
+            parser = value.get('parser', parser)
+            if value.get('recover'):
+                parser = 'recovering'
+        else:
+            expression = value
+        
+        if not isinstance(expression, str):
+            raise ValueError(f"Item {index}: expected an expression string")
+        if lexer not in LEXERS:
+            raise ValueError(f"Item {index}: unknown lexer {lexer!r}")
+        if parser not in PARSERS:
+            raise ValueError(f"Item {index}: unknown parser {parser!r}")
+        items.append((expression, lexer, parser))
+    
+    return items
+
+@app.route('/api/analyze-batch', methods=['POST'])
+def batch_analyze():
+    """Analyze a JSON array or NDJSON body of expressions
+    
+    Identical items are analyzed once: results holds one result per
+    distinct item and items maps every input item to its result. With
+    ?validate=true the response only has the count and one accepted
+    boolean per item.
+    """
+    try:
+        items = batch_items(request.get_data(), request.mimetype == 'application/x-ndjson',
+                            parser_name())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if len(items) > app.config['MAX_BATCH_ITEMS']:
+        return jsonify({'error': f"More than {app.config['MAX_BATCH_ITEMS']} items"}), 413
+    if any(expression_too_long(expression) for expression, _, _ in items):
+        return jsonify({'error': 'Expression too long'}), 413
+    
+    if wants_validation():
+        with reserved():
+            accepted = [recognize(expression) for expression, _, _ in items]
+        return jsonify({'count': len(items), 'accepted': accepted})
+    
+    with reserved():
+        indexes, results = analyze_unique(items,
+                                          workers=app.config['BATCH_WORKERS'],
+                                          chunk_size=app.config['BATCH_CHUNK_SIZE'],
+                                          sections=requested_sections(),
+                                          as_json=True)
+    return Response(stream_batch(indexes, results), mimetype='application/json')
+
 @app.route('/api/analyze-file', methods=['POST'])
 def analyze_file():
     if 'file' not in request.files:
@@ -29,30 +505,180 @@ def analyze_file():
     if file.filename == '':
         return jsonify({'error': 'No file selected'}), 400
     
+    # Streamed responses read the upload line by line and analyze each
+    # expression only when its result is written, so memory stays bounded
+    # by the longest line rather than the file size
+    parser = parser_name()
+    sections = requested_sections()
+    
+    # ?batch_id= records the results in the result store, and uploading
+    # the file again resumes after the last committed line
+    batch_id = request.args.get('batch_id')
+    if batch_id is not None:
+        if result_store is None:
+            return jsonify({'error': 'No result store; set RESULT_STORE'}), 404
+        store = result_store.view(parser, sections)
+        try:
+            progress = store.start_batch(batch_id)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        # Lines that are too long are left out of stored batches
+        def batch_lines():
+            expressions = (expression for expression in iter_expressions(upload_copy(file))
+                           if expression is not None)
+            return stored_batch_lines(store, batch_id, progress, expressions)
+        return reserved_response(batch_lines, 'application/x-ndjson')
+    
+    if request.args.get('format') == 'ndjson':
+        return reserved_response(lambda: stream_ndjson(analyze_lines(upload_copy(file), parser, sections)),
+                                 'application/x-ndjson')
+    
+    if wants_stream():
+        return reserved_response(lambda: stream_results(analyze_lines(upload_copy(file), parser, sections)),
+                                 'application/json')
+    
+    with reserved():
+        try:
+            content = file.read().decode('utf-8')
+            expressions = [line.strip() for line in content.split('\n') if line.strip()]
+            
+            results = list(analyze_batch(expressions,
+                                         workers=app.config['BATCH_WORKERS'],
+                                         chunk_size=app.config['BATCH_CHUNK_SIZE'],
+                                         parser=parser,
+                                         sections=sections,
+                                         as_json=True))
+            
+            return Response(stream_encoded_results(results), mimetype='application/json')
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+@app.route('/api/documents', methods=['POST'])
+def create_document():
+    data = request.json
+    expression = data.get('expression', '')
+    
+    if not expression:
+        return jsonify({'error': 'No expression provided'}), 400
+    if expression_too_long(expression):
+        return jsonify({'error': 'Expression too long'}), 413
+    
+    # Documents live in this process, so they are analyzed in the request
+    # thread while holding a pool slot
+    with reserved():
+        document_id, document = documents.create(expression)
+        result = document.to_dict()
+    return jsonify({
+        'document_id': document_id,
+        'version': document.version,
+        'result': result
+    })
+
+@app.route('/api/documents/<document_id>', methods=['GET'])
+def get_document(document_id):
+    document = documents.get(document_id)
+    if document is None:
+        return jsonify({'error': 'Unknown document'}), 404
+    
+    return jsonify({
+        'document_id': document_id,
+        'version': document.version,
+        'result': document.to_dict()
+    })
+
+@app.route('/api/documents/<document_id>/edits', methods=['POST'])
+def edit_document(document_id):
+    """Apply {offset, deleted, inserted} to a document
+    
+    Returns only the replaced token window; GET the document for the full
+    result.
+    """
+    data = request.json
     try:
-        content = file.read().decode('utf-8')
-        expressions = [line.strip() for line in content.split('\n') if line.strip()]
-        
-        results = []
-        for expression in expressions:
-            result = analyze_expression(expression)
-            results.append(result)
-        
-        return jsonify({'results': results})
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        offset = int(data.get('offset', 0))
+        deleted = int(data.get('deleted', 0))
+        inserted = str(data.get('inserted', ''))
+        with reserved():
+            document, change = documents.edit(document_id, offset, deleted, inserted)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if document is None:
+        return jsonify({'error': 'Unknown document'}), 404
+    
+    analysis = document.analysis
+    return jsonify({
+        'document_id': document_id,
+        'version': document.version,
+        'mode': change['mode'],
+        'is_accepted': analysis.is_accepted,
+        'error': analysis.error,
+        'token_edit': {
+            'start': change['start'],
+            'removed': change['removed'],
+            'tokens': [token.to_dict() for token in change['tokens'] or []]
+        }
+    })
+
+@app.route('/api/trees/<tree_id>/nodes/<int:node_id>', methods=['GET'])
+def get_tree_node(tree_id, node_id):
+    """Return a node of a stored parse tree with ?depth=N levels below it
+    
+    The default depth of 1 returns the node and its children. ?limit= lowers
+    the number of nodes returned, at most MAX_TREE_SLICE_NODES.
+    """
+    dag = tree_store.get(tree_id)
+    if dag is None:
+        return jsonify({'error': 'Unknown tree'}), 404
+    if node_id >= len(dag.nodes):
+        return jsonify({'error': 'Unknown node'}), 404
+    
+    max_nodes = min(int_arg('limit', app.config['MAX_TREE_SLICE_NODES']),
+                    app.config['MAX_TREE_SLICE_NODES'])
+    return jsonify({
+        'tree_id': tree_id,
+        'node': tree_slice(dag, node_id, min(int_arg('depth', 1), app.config['MAX_TREE_SLICE_DEPTH']),
+                           max_nodes)
+    })
+
+@app.route('/api/tree-stats', methods=['GET'])
+def tree_stats():
+    return jsonify(tree_store.stats())
+
+@app.route('/api/batches/<path:batch_id>', methods=['GET'])
+def get_batch(batch_id):
+    """Progress of an /api/analyze-file?batch_id= batch"""
+    if result_store is None:
+        return jsonify({'error': 'No result store; set RESULT_STORE'}), 404
+    progress = result_store.batch(batch_id)
+    if progress is None:
+        return jsonify({'error': 'Unknown batch'}), 404
+    return jsonify(progress)
+
+@app.route('/', methods=['GET'])
+def health_check():
+    return jsonify({"status": "healthy", "message": "Lexical Analyzer API is running"})
 
 @app.route('/api/examples', methods=['GET'])
 def get_examples():
-    examples = [
-        "3+4*5",
-        "a+b*c",
-        "x*(y+z)",
-        "(a+b)*c",
-        "1+2+3+4",
-        "1*2*3*4"
-    ]
-    return jsonify({'examples': examples})
+    return jsonify({'examples': EXAMPLES})
+
+@app.route('/api/cache-stats', methods=['GET'])
+def cache_stats():
+    return jsonify(result_cache.stats())
+
+@app.route('/api/pool-stats', methods=['GET'])
+def pool_stats():
+    if analysis_pool is None:
+        return jsonify({'error': 'No analysis pool; run the server with serving.py'}), 404
+    return jsonify(analysis_pool.stats())
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Instrumentation metrics in the Prometheus text format"""
+    if not instrumentation.is_enabled():
+        return jsonify({'error': 'Instrumentation is disabled'}), 404
+    return Response(instrumentation.metrics.render(), mimetype='text/plain; version=0.0.4')
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
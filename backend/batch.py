@@ -0,0 +1,100 @@
+# Parallel batch analysis
+# Fans a batch of expressions out to a process pool in chunks and yields the
+# results of analyze_expression in input order, as dicts or as JSON text
+
+import os
+from itertools import chain, islice
+
+from json_stream import encode_analysis
+from lexical_analyzer import DEFAULT_SECTIONS, analyze_expression, run_analysis
+
+# Expressions sent to a worker per task
+DEFAULT_CHUNK_SIZE = 256
+
+# Batches shorter than this are analyzed in-process, where starting a pool
+# would cost more than it saves
+MIN_PARALLEL_BATCH = 2000
+
+
+def analysis_text(expression, lexer='scalar', parser='iterative', sections=DEFAULT_SECTIONS):
+    """Return the analyze_expression result as JSON text
+    
+    Unlike json.dumps() of the result dict, this is not limited in the depth
+    of the parse tree, and the text pickles without recursion when it is
+    sent back from a worker process.
+    """
+    return encode_analysis(run_analysis(expression, lexer, parser, sections))
+
+
+def _analyze_chunk(task):
+    expressions, lexer, parser, sections, as_json = task
+    analyze = analysis_text if as_json else analyze_expression
+    return [analyze(expression, lexer, parser, sections) for expression in expressions]
+
+
+def _chunks(expressions, chunk_size, lexer, parser, sections, as_json):
+    iterator = iter(expressions)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk, lexer, parser, sections, as_json
+
+
+def analyze_batch(expressions, workers=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                  min_parallel=MIN_PARALLEL_BATCH, lexer='scalar', parser='iterative',
+                  sections=DEFAULT_SECTIONS, as_json=False):
+    """Yield analyze_expression results for expressions in input order
+    
+    expressions may be any iterable and is consumed lazily. workers defaults
+    to the number of CPUs; with one worker, or fewer than min_parallel
+    expressions, everything runs in the current process. With as_json the
+    results are JSON text from analysis_text() instead of dicts.
+    """
+    workers = workers or os.cpu_count() or 1
+    iterator = iter(expressions)
+    head = list(islice(iterator, min_parallel))
+    
+    if workers == 1 or len(head) < min_parallel:
+        analyze = analysis_text if as_json else analyze_expression
+        for expression in chain(head, iterator):
+            yield analyze(expression, lexer, parser, sections)
+        return
+    
+    # multiprocessing is imported on first use; it is the slowest import of
+    # the API and most requests never start a pool
+    from multiprocessing import Pool
+    
+    with Pool(workers) as pool:
+        tasks = _chunks(chain(head, iterator), chunk_size, lexer, parser, sections, as_json)
+        # imap keeps task order, so results come back in input order
+        for results in pool.imap(_analyze_chunk, tasks):
+            yield from results
+
+
+def analyze_unique(items, workers=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                   min_parallel=MIN_PARALLEL_BATCH, sections=DEFAULT_SECTIONS, as_json=False):
+    """Analyze (expression, lexer, parser) items, each distinct item once
+    
+    Returns (indexes, results): results holds the analyze_expression result
+    of every distinct item in order of first appearance, as JSON text with
+    as_json, and indexes[i] is the position in results of the result for
+    items[i].
+    """
+    positions = {}
+    indexes = [positions.setdefault(item, len(positions)) for item in items]
+    
+    # Items analyzed with the same engines go through one batch
+    groups = {}
+    for (expression, lexer, parser), position in positions.items():
+        groups.setdefault((lexer, parser), []).append((position, expression))
+    
+    results = [None] * len(positions)
+    for (lexer, parser), entries in groups.items():
+        expressions = [expression for _, expression in entries]
+        analyses = analyze_batch(expressions, workers, chunk_size, min_parallel, lexer, parser, sections,
+                                 as_json)
+        for (position, _), result in zip(entries, analyses):
+            results[position] = result
+    
+    return indexes, results
@@ -0,0 +1,798 @@
+# Benchmarks for the lexical analyzer and parser
+# Run with: python benchmark.py [name ...]
+# The workload suite runs with: python benchmark.py suite [--save FILE] [--baseline FILE]
+
+import argparse
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from batch import analyze_batch, analyze_unique
+from cache import ResultCache
+from evaluator import compile_expression, run_instructions
+from incremental import Document
+from json_stream import analysis_pieces, stream_results
+from lexical_analyzer import (ColumnarSymbolTable, CompactParser, IterativeParser, Lexer, ParseDag,
+                              Parser, RecoveringParser, RegexLexer, SymbolTable, TokenStream, VectorLexer,
+                              analyze_expression, recognize, run_analysis)
+from push_analysis import PushAnalyzer
+from workloads import (WORKLOADS, error_heavy, expression_file, flat_sum, generate,
+                       long_expression)
+
+
+def best_time(func, arg, repeat=5):
+    """Return the best wall time in seconds of func(arg) over several runs"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(arg)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def report(label, baseline, candidate):
+    print(f"{label:<28} {baseline * 1000:10.3f} ms {candidate * 1000:10.3f} ms "
+          f"{baseline / candidate:8.2f}x")
+
+
+def _analyze_two_pass(text):
+    # The analysis pipeline before single-pass lexing: tokenize for the
+    # token listing, then lex the same text again while parsing
+    lexer = Lexer(text)
+    tokens = lexer.tokenize()
+    symbol_table = SymbolTable()
+    parser = Parser(Lexer(text), symbol_table)
+    parse_tree, is_accepted, error = parser.parse()
+    result = {
+        'input': text,
+        'tokens': [token.to_dict() for token in tokens],
+        'is_accepted': is_accepted,
+        'symbol_table': symbol_table.get_table(),
+        'error': error
+    }
+    if parse_tree:
+        result['parse_tree'] = parse_tree.to_dict()
+    return result
+
+
+def bench_single_pass():
+    """Two-pass lexing versus the shared token stream in analyze_expression"""
+    print(f"{'input':<28} {'two-pass':>13} {'single-pass':>13} {'speedup':>9}")
+    for terms in (10, 50, 100, 200):
+        text = long_expression(terms)
+        # Both sides use the recursive Parser, so only the lexing differs
+        report(f"{terms} terms ({len(text)} chars)",
+               best_time(_analyze_two_pass, text),
+               best_time(lambda t: analyze_expression(t, parser='recursive'), text))
+
+
+def bench_regex_lexer():
+    """Character-at-a-time Lexer versus the master-pattern RegexLexer"""
+    print(f"{'input':<28} {'scalar':>13} {'regex':>13} {'speedup':>9}")
+    inputs = [
+        ('short sum', '3+4*5'),
+        ('1000 terms', long_expression(1000)),
+        ('10000 terms', long_expression(10000)),
+        ('long identifiers', ' + '.join(['identifier' * 20] * 1000)),
+        ('many lines', '\n'.join(['(a+b)*c'] * 10000)),
+    ]
+    for label, text in inputs:
+        report(label,
+               best_time(lambda t: Lexer(t).tokenize(), text),
+               best_time(lambda t: RegexLexer(t).tokenize(), text))
+
+
+def bench_vector_lexer():
+    """Scalar Lexer versus the NumPy VectorLexer by input length"""
+    try:
+        VectorLexer('')
+    except ImportError as e:
+        print(e)
+        return
+    
+    def materialized(text):
+        # Build every Token, as a full analysis does
+        return list(VectorLexer(text).tokenize())
+    
+    def analysis(lexer):
+        # A full analysis serialized to JSON, which is what the API returns
+        return lambda text: ''.join(analysis_pieces(run_analysis(text, lexer=lexer)))
+    
+    print(f"{'input':<28} {'scalar':>13} {'numpy':>13} {'speedup':>9} "
+          f"{'all tokens':>13} {'speedup':>9} {'analysis':>9}")
+    for terms in (1, 3, 10, 30, 100, 1000, 10000, 100000):
+        text = long_expression(terms)
+        repeat = 5 if terms < 10000 else 3
+        scalar = best_time(lambda t: Lexer(t).tokenize(), text, repeat)
+        vector = best_time(lambda t: VectorLexer(t).tokenize(), text, repeat)
+        full = best_time(materialized, text, repeat)
+        end_to_end = (best_time(analysis('scalar'), text, repeat)
+                      / best_time(analysis('numpy'), text, repeat))
+        print(f"{f'{terms} terms ({len(text)} chars)':<28} {scalar * 1000:10.3f} ms "
+              f"{vector * 1000:10.3f} ms {scalar / vector:8.2f}x {full * 1000:10.3f} ms "
+              f"{scalar / full:8.2f}x {end_to_end:8.2f}x")
+
+
+def bench_push_lexer():
+    """Analysis after a slow upload completes versus while it arrives"""
+    chunks = 50
+    delay = 0.01
+    print(f"{chunks} chunks arriving {delay * 1000:.0f} ms apart; time from the last chunk to the result")
+    print(f"{'input':<28} {'buffered':>13} {'push':>13} {'speedup':>9}")
+    for terms in (1000, 5000, 20000):
+        text = long_expression(terms)
+        size = len(text) // chunks + 1
+        parts = [text[i:i + size] for i in range(0, len(text), size)]
+        
+        def buffered(parts):
+            received = []
+            for part in parts:
+                time.sleep(delay)
+                received.append(part)
+            start = time.perf_counter()
+            run_analysis(''.join(received)).to_dict()
+            return time.perf_counter() - start
+        
+        def push(parts):
+            analyzer = PushAnalyzer()
+            for part in parts:
+                time.sleep(delay)
+                analyzer.feed(part)
+            start = time.perf_counter()
+            analyzer.close().to_dict()
+            return time.perf_counter() - start
+        
+        report(f"{terms} terms ({len(text)} chars)",
+               min(buffered(parts) for _ in range(3)), min(push(parts) for _ in range(3)))
+
+
+def _parse_with(parser_class):
+    def parse(tokens):
+        lexer, token_list = tokens
+        parser = parser_class(lexer.token_stream(), SymbolTable())
+        return parser.parse()
+    return parse
+
+
+def bench_iterative_parser():
+    """Recursive descent Parser versus the explicit-stack IterativeParser"""
+    print(f"{'input':<28} {'recursive':>13} {'iterative':>13} {'speedup':>9}")
+    inputs = [
+        ('100 terms', long_expression(100)),
+        ('200 terms', long_expression(200)),
+        ('100 nested parens', '(' * 100 + 'a' + ')' * 100),
+    ]
+    for label, text in inputs:
+        lexer = Lexer(text)
+        tokens = (lexer, lexer.tokenize())
+        report(label,
+               best_time(_parse_with(Parser), tokens),
+               best_time(_parse_with(IterativeParser), tokens))
+    
+    # Inputs beyond the recursion limit only the iterative parser accepts
+    for label, text in [('100000 terms', '+'.join(['1'] * 100000)),
+                        ('100000 nested parens', '(' * 100000 + 'a' + ')' * 100000)]:
+        lexer = Lexer(text)
+        tokens = (lexer, lexer.tokenize())
+        elapsed = best_time(_parse_with(IterativeParser), tokens, repeat=1)
+        print(f"{label:<28} {'-':>13} {elapsed * 1000:10.3f} ms "
+              f"{len(tokens[1]) / elapsed:10.0f} tokens/s")
+
+
+def tree_memory(parser_class, lexer):
+    """Return the bytes allocated by the parse tree that parser_class builds"""
+    parser = parser_class(lexer.token_stream(), SymbolTable())
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    root, is_accepted, error = parser.parse()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before
+
+
+def bench_compact_tree():
+    """Memory and time of Node trees versus CompactTree for 10^5 tokens"""
+    text = long_expression(12500)
+    lexer = Lexer(text)
+    tokens = (lexer, lexer.tokenize())
+    token_count = len(tokens[1])
+    print(f"{token_count} tokens")
+    print(f"{'tree':<28} {'parse':>13} {'memory':>13} {'per token':>12}")
+    for label, parser_class in (('Node', IterativeParser), ('CompactTree', CompactParser)):
+        elapsed = best_time(_parse_with(parser_class), tokens, repeat=3)
+        memory = tree_memory(parser_class, lexer)
+        print(f"{label:<28} {elapsed * 1000:10.3f} ms {memory / 2 ** 20:10.2f} MB "
+              f"{memory / token_count:8.1f} B")
+
+
+def _retained_memory(sections):
+    def analyze(text):
+        # The analysis is kept alive, so the memory still in use after it is
+        # built is the memory the result holds
+        tracemalloc.start()
+        analysis = run_analysis(text, sections=sections)
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return memory, analysis
+    return analyze
+
+
+def bench_parse_dag():
+    """Parse tree versus hash-consed ParseDag for repetitive expressions"""
+    inputs = [
+        ('12500 (a+b)*c terms', long_expression(12500)),
+        ('100000 uses of 5 names', flat_sum(100000)[0]),
+    ]
+    for label, text in inputs:
+        print(label)
+        print(f"{'sections':<28} {'analyze':>13} {'memory':>13} {'nodes':>10} {'JSON':>12}")
+        for sections in (('cst',), ('dag',)):
+            elapsed = best_time(lambda text: run_analysis(text, sections=sections), text, repeat=3)
+            memory, analysis = _retained_memory(sections)(text)
+            if analysis.dag:
+                nodes = analysis.dag.stats()['dag_nodes']
+            else:
+                nodes = ParseDag(analysis.parse_tree).stats()['tree_nodes']
+            size = sum(len(piece) for piece in analysis_pieces(analysis))
+            print(f"{sections[0]:<28} {elapsed * 1000:10.3f} ms {memory / 2 ** 20:10.2f} MB "
+                  f"{nodes:10} {size / 2 ** 20:9.2f} MB")
+
+
+def peak_memory(func, arg):
+    """Return the peak bytes allocated while running func(arg)"""
+    tracemalloc.start()
+    func(arg)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def _fill_table(table_class):
+    def fill(tokens):
+        table = table_class()
+        for token in tokens:
+            table.add_symbol(token)
+        return table
+    return fill
+
+
+def bench_symbol_table():
+    """Per-name dict SymbolTable versus the columnar ColumnarSymbolTable"""
+    inputs = [
+        ('200000 distinct names', '+'.join(f'v{i}' for i in range(200000))),
+        ('200000 uses of 5 names', flat_sum(200000)[0]),
+    ]
+    for label, text in inputs:
+        tokens = Lexer(text).tokenize()
+        name = tokens[0].value
+        print(label)
+        print(f"{'table':<28} {'build':>13} {'get_table':>13} {'memory':>12} {'uses of a name':>16}")
+        
+        def relex(text):
+            # Without positions in the table, finding the uses means lexing again
+            return [token.position for token in Lexer(text).tokenize() if token.value == name]
+        
+        for table_class, find in ((SymbolTable, relex),
+                                  (ColumnarSymbolTable, lambda text: table.positions(name))):
+            fill = _fill_table(table_class)
+            table = fill(tokens)
+            print(f"{table_class.__name__:<28} {best_time(fill, tokens, repeat=3) * 1000:10.3f} ms "
+                  f"{best_time(lambda t: t.get_table(), table, repeat=3) * 1000:10.3f} ms "
+                  f"{peak_memory(fill, tokens) / 2 ** 20:9.2f} MB "
+                  f"{best_time(find, text, repeat=3) * 1000:13.3f} ms")
+
+
+def _serialize_dicts(expressions):
+    # The /api/analyze-file response before streaming: every result dict
+    # is built first and the whole document is encoded at once
+    return json.dumps({'results': [analyze_expression(e) for e in expressions]})
+
+
+def _serialize_stream(expressions):
+    for chunk in stream_results(run_analysis(e) for e in expressions):
+        pass
+
+
+def bench_json_stream():
+    """Peak memory of dict + json.dumps versus streamed JSON for file batches"""
+    print(f"{'input':<28} {'dicts':>13} {'stream':>13} {'saving':>9}")
+    for lines in (10, 100, 1000):
+        expressions = [long_expression(10)] * lines
+        dicts = peak_memory(_serialize_dicts, expressions)
+        stream = peak_memory(_serialize_stream, expressions)
+        print(f"{str(lines) + ' lines':<28} {dicts / 2 ** 20:10.2f} MB "
+              f"{stream / 2 ** 20:10.2f} MB {dicts / stream:8.2f}x")
+
+
+def bench_batch_scaling():
+    """Batch analysis throughput with 1, 2, 4 and 8 worker processes"""
+    print(f"{os.cpu_count()} CPUs")
+    print(f"{'input':<28} {'workers':>8} {'time':>13} {'expressions/s':>15}")
+    for lines in (10000, 50000):
+        path = expression_file(lines)
+        try:
+            with open(path) as file:
+                expressions = [line.strip() for line in file if line.strip()]
+            for workers in (1, 2, 4, 8):
+                elapsed = best_time(lambda e: list(analyze_batch(e, workers=workers, min_parallel=0)),
+                                    expressions, repeat=1)
+                print(f"{str(lines) + ' lines':<28} {workers:>8} {elapsed * 1000:10.1f} ms "
+                      f"{len(expressions) / elapsed:15.0f}")
+        finally:
+            os.remove(path)
+
+
+def bench_batch_dedup():
+    """Analyzing every batch item versus each distinct item once"""
+    expressions = generate('many-lines', 4)
+    items = [(expression, 'scalar', 'iterative') for expression in expressions]
+    print(f"{len(items)} items, {len(set(items))} distinct")
+    print(f"{'mode':<28} {'all items':>13} {'distinct':>13} {'speedup':>9}")
+    baseline = best_time(lambda e: list(analyze_batch(e, workers=1)), expressions, repeat=3)
+    report('in-process', baseline, best_time(lambda i: analyze_unique(i, workers=1), items, repeat=3))
+
+
+# Result sections compared by the projections benchmark
+PROJECTIONS = {
+    'full (default)': ('tokens', 'symbols', 'cst'),
+    'tokens': ('tokens',),
+    'symbols': ('symbols',),
+    'occurrences': ('occurrences',),
+    'cst': ('cst',),
+    'ast': ('ast',),
+    'accept only': (),
+}
+
+
+def bench_projections():
+    """Analysis plus JSON serialization time and response size per projection"""
+    for label, expressions in (('1000 terms', [long_expression(1000)]),
+                               ('2000 lines', generate('many-lines', 0.4))):
+        print(f"{label}")
+        print(f"{'sections':<28} {'full':>13} {'projection':>13} {'speedup':>9} {'bytes':>12}")
+        
+        def serialize(sections):
+            def run(items):
+                return sum(len(''.join(analysis_pieces(run_analysis(text, sections=sections))))
+                           for text in items)
+            return run
+        
+        baseline = best_time(serialize(PROJECTIONS['full (default)']), expressions, repeat=3)
+        for name, sections in PROJECTIONS.items():
+            elapsed = best_time(serialize(sections), expressions, repeat=3)
+            size = serialize(sections)(expressions)
+            print(f"{name:<28} {baseline * 1000:10.3f} ms {elapsed * 1000:10.3f} ms "
+                  f"{baseline / elapsed:8.2f}x {size:12d}")
+
+
+def bench_recognize():
+    """Accept-only analysis versus the recognizer, with recognizer throughput"""
+    print(f"{'workload':<28} {'accept only':>13} {'recognize':>13} {'speedup':>9} {'MB/s':>9}")
+    for name in ('flat-sum', 'deep-nesting', 'long-identifiers', 'many-lines', 'error-heavy'):
+        expressions = generate(name)
+        size = sum(len(text) for text in expressions)
+        disagreements = sum(recognize(text) != run_analysis(text, sections=()).is_accepted
+                            for text in expressions)
+        if disagreements:
+            print(f"{name}: recognize disagrees with the parser on {disagreements} expressions")
+        baseline = best_time(lambda items: [run_analysis(text, sections=()).is_accepted
+                                            for text in items], expressions, repeat=3)
+        candidate = best_time(lambda items: [recognize(text) for text in items], expressions, repeat=3)
+        print(f"{name:<28} {baseline * 1000:10.3f} ms {candidate * 1000:10.3f} ms "
+              f"{baseline / candidate:8.2f}x {size / candidate / 2 ** 20:9.1f}")
+
+
+def _walk_tree(node, bindings):
+    # Naive evaluation: recurse through the parse tree for every row
+    name = node.name
+    if name == 'ID':
+        return int(node.value) if node.value.isdecimal() else bindings[node.value]
+    if name == 'F':
+        return _walk_tree(node.children[1] if len(node.children) == 3 else node.children[0], bindings)
+    # E -> T E' and T -> F T': fold the operator chain of the primed node
+    value = _walk_tree(node.children[0], bindings)
+    rest = node.children[1]
+    while rest.children[0].name != 'Ɛ':
+        operand = _walk_tree(rest.children[1], bindings)
+        value = value + operand if rest.children[0].name == 'PLUS' else value * operand
+        rest = rest.children[2]
+    return value
+
+
+def bench_evaluator():
+    """Parse tree walking versus compiled and NumPy batch evaluation"""
+    text = 'a*(b+3)+c*c*2+(a+b)*(c+7)+a*b*c'
+    tree = run_analysis(text).parse_tree
+    compiled = compile_expression(text)
+    rows = 20000
+    rng = random.Random(0)
+    bindings = [{name: rng.randint(-100, 100) for name in compiled.variables} for _ in range(rows)]
+    
+    print(f"{text}: {rows} rows one at a time")
+    print(f"{'mode':<28} {'tree walk':>13} {'compiled':>13} {'speedup':>9}")
+    baseline = best_time(lambda rows: [_walk_tree(tree, row) for row in rows], bindings, repeat=3)
+    report('closure', baseline, best_time(lambda rows: [compiled.evaluate(row) for row in rows],
+                                          bindings, repeat=3))
+    report('instruction list', baseline,
+           best_time(lambda rows: [run_instructions(compiled.instructions, compiled.values(row))
+                                   for row in rows], bindings, repeat=3))
+    
+    try:
+        import numpy
+    except ImportError:
+        print("Batch evaluation requires NumPy")
+        return
+    
+    print(f"{text}: NumPy batch evaluation")
+    print(f"{'rows':<28} {'closure (est.)':>13} {'batch':>13} {'speedup':>9} {'rows/s':>12}")
+    per_row = best_time(lambda rows: [compiled.evaluate(row) for row in rows], bindings, repeat=3) / rows
+    for size in (10 ** 4, 10 ** 6, 10 ** 7):
+        generator = numpy.random.default_rng(0)
+        columns = {name: generator.integers(-100, 100, size) for name in compiled.variables}
+        elapsed = best_time(compiled.evaluate_batch, columns, repeat=3)
+        print(f"{size:<28} {per_row * size * 1000:10.3f} ms {elapsed * 1000:10.3f} ms "
+              f"{per_row * size / elapsed:8.2f}x {size / elapsed:12.0f}")
+
+
+def bench_result_cache():
+    """Uncached analysis + serialization versus dict and JSON cache hits"""
+    expressions = ["3+4*5", "a+b*c", "x*(y+z)", "(a+b)*c", long_expression(50)] * 200
+    dict_cache = ResultCache()
+    json_cache = ResultCache(cache_json=True)
+    
+    def uncached(items):
+        for text in items:
+            json.dumps(analyze_expression(text), separators=(',', ':'))
+    
+    def dict_hits(items):
+        for text in items:
+            json.dumps(dict_cache.analyze(text), separators=(',', ':'))
+    
+    def json_hits(items):
+        for text in items:
+            json_cache.analyze_json(text)
+    
+    baseline = best_time(uncached, expressions)
+    print(f"{'mode':<28} {'uncached':>13} {'cached':>13} {'speedup':>9}")
+    report('dict cache', baseline, best_time(dict_hits, expressions))
+    report('JSON bytes cache', baseline, best_time(json_hits, expressions))
+    print(f"dict cache {dict_cache.stats()}")
+    print(f"JSON cache {json_cache.stats()}")
+
+
+def bench_incremental():
+    """Edit latency of an incremental Document versus re-analyzing the text"""
+    print(f"{'input':<28} {'full':>13} {'incremental':>13} {'speedup':>9}")
+    for terms in (100, 1000, 10000):
+        text = long_expression(terms)
+        # Replace the 'a' in the middle term by a sum, inside a group, and
+        # append a term to the top-level sum; each edit is then undone
+        middle = (terms // 2) * len('(a+b)*c+') + 1
+        edits = [
+            ('group', middle, 'a', 'x+y'),
+            ('top level', len(text), '', '+d'),
+        ]
+        for label, offset, old, new in edits:
+            edited = text[:offset] + new + text[offset + len(old):]
+            
+            def incremental(document):
+                document.edit(offset, len(old), new)
+                document.edit(offset, len(new), old)
+            
+            full = best_time(lambda t: (run_analysis(edited), run_analysis(text)), text, repeat=3)
+            document = Document(text)
+            report(f"{terms} terms, {label}", full, best_time(incremental, document, repeat=3))
+
+
+def _errors_by_restart(lexer, build_tree=True):
+    # Every syntax error found with a raising parser: after each error, parse
+    # again from the token following the one that failed
+    tokens = lexer.tokens
+    errors = []
+    start = 0
+    while True:
+        stream = TokenStream(tokens[start:], lexer.eof_token)
+        parser = IterativeParser(stream, SymbolTable())
+        parser.build_tree = build_tree
+        parse_tree, is_accepted, error = parser.parse()
+        if is_accepted:
+            break
+        errors.append(error)
+        start += stream.pos
+        if start >= len(tokens):
+            break
+    return errors
+
+
+def _errors_by_recovery(lexer, build_tree=True):
+    parser = RecoveringParser(lexer.token_stream(), SymbolTable())
+    parser.build_tree = build_tree
+    parser.parse()
+    return parser.errors
+
+
+def bench_recovery():
+    """Raise-and-catch parsing versus panic-mode recovery on rejected input"""
+    expressions = error_heavy(20000)
+    inputs = [
+        ('1 expression per line', expressions),
+        ('10 expressions per line', ['+'.join(expressions[i:i + 10]) for i in range(0, len(expressions), 10)]),
+    ]
+    for label, texts in inputs:
+        lexers = []
+        for text in texts:
+            lexer = Lexer(text, recover=True)
+            lexer.tokenize()
+            lexers.append(lexer)
+        
+        # Both find the same first error. After it, restarting parses the
+        # rest as a new expression without the enclosing parentheses and
+        # operators, while recovery resynchronizes inside them, so the
+        # later errors differ: restarting misses unclosed parentheses at
+        # the end and reports the ')' and operators recovery skips.
+        errors = restarted = 0
+        for lexer in lexers:
+            recovered = _errors_by_recovery(lexer)
+            restart_errors = _errors_by_restart(lexer)
+            assert recovered[:1] == restart_errors[:1], lexer.text
+            errors += len(recovered)
+            restarted += len(restart_errors)
+        print(f"{label}: {len(lexers)} lines, {errors} syntax errors found by recovery, "
+              f"{restarted} by restarting, the first error of every line the same")
+        
+        print(f"{'mode':<28} {'restart':>13} {'recovery':>13} {'speedup':>9}")
+        for mode, build_tree in (('with parse tree', True), ('errors only', False)):
+            report(mode,
+                   best_time(lambda items: [_errors_by_restart(lexer, build_tree) for lexer in items],
+                             lexers, repeat=3),
+                   best_time(lambda items: [_errors_by_recovery(lexer, build_tree) for lexer in items],
+                             lexers, repeat=3))
+
+
+# Import statement and first call timed by the cold-start benchmark
+COLD_START_TARGETS = {
+    'engine': ("import lexical_analyzer",
+               "lexical_analyzer.analyze_expression('(a+b)*c')"),
+    'api': ("import app",
+            "app.app.test_client().post('/api/analyze', json={'expression': '(a+b)*c'}).get_data()"),
+}
+
+_COLD_START_SCRIPT = '''
+import time
+start = time.perf_counter()
+{imports}
+imported = time.perf_counter()
+{first_call}
+print(imported - start, time.perf_counter() - imported)
+'''
+
+
+def cold_start(imports, first_call):
+    """Return (import, first call) seconds measured in a fresh interpreter"""
+    script = _COLD_START_SCRIPT.format(imports=imports, first_call=first_call)
+    output = subprocess.run([sys.executable, '-c', script], cwd=os.path.dirname(os.path.abspath(__file__)),
+                            capture_output=True, text=True, check=True).stdout
+    import_time, call_time = output.split()
+    return float(import_time), float(call_time)
+
+
+def bench_cold_start():
+    """Import time plus first request in a fresh interpreter, best of 5"""
+    print(f"{'target':<28} {'import':>13} {'first call':>13} {'total':>13}")
+    for name, (imports, first_call) in COLD_START_TARGETS.items():
+        try:
+            runs = [cold_start(imports, first_call) for _ in range(5)]
+        except subprocess.CalledProcessError as e:
+            print(f"{name:<28} skipped: {e.stderr.strip().splitlines()[-1]}")
+            continue
+        import_time, call_time = min(runs, key=sum)
+        print(f"{name:<28} {import_time * 1000:10.3f} ms {call_time * 1000:10.3f} ms "
+              f"{(import_time + call_time) * 1000:10.3f} ms")
+
+
+BENCHMARKS = {
+    'single-pass': bench_single_pass,
+    'regex-lexer': bench_regex_lexer,
+    'vector-lexer': bench_vector_lexer,
+    'push-lexer': bench_push_lexer,
+    'iterative-parser': bench_iterative_parser,
+    'compact-tree': bench_compact_tree,
+    'parse-dag': bench_parse_dag,
+    'json-stream': bench_json_stream,
+    'symbol-table': bench_symbol_table,
+    'batch-scaling': bench_batch_scaling,
+    'batch-dedup': bench_batch_dedup,
+    'result-cache': bench_result_cache,
+    'evaluator': bench_evaluator,
+    'projections': bench_projections,
+    'recognize': bench_recognize,
+    'incremental': bench_incremental,
+    'recovery': bench_recovery,
+    'cold-start': bench_cold_start,
+}
+
+
+SUITE_STAGES = ('lex', 'parse', 'to_dict', 'analyze', 'endpoint')
+
+
+def _lex_all(expressions):
+    lexers = []
+    for text in expressions:
+        lexer = Lexer(text)
+        try:
+            lexer.tokenize()
+        except Exception:
+            continue
+        lexers.append(lexer)
+    return lexers
+
+
+def _parse_all(lexers):
+    trees = []
+    for lexer in lexers:
+        parser = IterativeParser(lexer.token_stream(), SymbolTable())
+        parse_tree, is_accepted, error = parser.parse()
+        if parse_tree:
+            trees.append(parse_tree)
+    return trees
+
+
+def _to_dict_all(trees):
+    for tree in trees:
+        tree.to_dict()
+
+
+def _analyze_all(expressions):
+    return [analyze_expression(text) for text in expressions]
+
+
+def _endpoint_runner():
+    """Return a function posting expressions to the Flask app, or None"""
+    try:
+        import app as app_module
+    except ImportError as e:
+        print(f"endpoint stage skipped: {e}")
+        return None
+    
+    client = app_module.app.test_client()
+    
+    def post(expressions):
+        # Start from an empty result cache so every request is analyzed
+        app_module.result_cache.clear()
+        if len(expressions) == 1:
+            response = client.post('/api/analyze', json={'expression': expressions[0]})
+        else:
+            content = '\n'.join(expressions).encode('utf-8')
+            response = client.post('/api/analyze-file',
+                                   data={'file': (io.BytesIO(content), 'expressions.txt')},
+                                   content_type='multipart/form-data')
+        response.get_data()
+    
+    return post
+
+
+def run_suite(scale=1.0, repeat=3):
+    """Time every stage of every workload and return the measurements"""
+    results = {}
+    post = _endpoint_runner()
+    
+    for name in WORKLOADS:
+        expressions = generate(name, scale)
+        lexers = _lex_all(expressions)
+        trees = _parse_all(lexers)
+        tokens = sum(len(lexer.tokens) for lexer in lexers)
+        
+        stages = {
+            'lex': (_lex_all, expressions),
+            'parse': (_parse_all, lexers),
+            'to_dict': (_to_dict_all, trees),
+            'analyze': (_analyze_all, expressions),
+        }
+        if post is not None:
+            stages['endpoint'] = (post, expressions)
+        
+        measurements = {}
+        for stage, (func, arg) in stages.items():
+            seconds = best_time(func, arg, repeat=repeat)
+            measurements[stage] = {
+                'seconds': seconds,
+                'tokens_per_s': tokens / seconds if seconds else None,
+                'expressions_per_s': len(expressions) / seconds if seconds else None
+            }
+        
+        results[name] = {
+            'expressions': len(expressions),
+            'tokens': tokens,
+            'peak_bytes': peak_memory(_analyze_all, expressions),
+            'stages': measurements
+        }
+    
+    return results
+
+
+def print_suite(results, baseline=None, threshold=0.1):
+    """Print suite results and return the stages slower than the baseline"""
+    regressions = []
+    print(f"{'workload':<18} {'stage':<9} {'time':>12} {'tokens/s':>12} "
+          f"{'expr/s':>10} {'peak':>10} {'vs base':>8}")
+    
+    for name, workload in results.items():
+        base_stages = (baseline or {}).get(name, {}).get('stages', {})
+        for stage in SUITE_STAGES:
+            measurement = workload['stages'].get(stage)
+            if measurement is None:
+                continue
+            
+            versus = ''
+            base = base_stages.get(stage)
+            if base:
+                ratio = measurement['seconds'] / base['seconds']
+                versus = f"{ratio:7.2f}x"
+                if ratio > 1 + threshold:
+                    versus += '!'
+                    regressions.append((name, stage, ratio))
+            
+            peak = f"{workload['peak_bytes'] / 2 ** 20:7.1f} MB" if stage == 'analyze' else ''
+            print(f"{name:<18} {stage:<9} {measurement['seconds'] * 1000:9.1f} ms "
+                  f"{measurement['tokens_per_s']:12.0f} {measurement['expressions_per_s']:10.1f} "
+                  f"{peak:>10} {versus:>8}")
+    
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the lexical analyzer and parser')
+    parser.add_argument('names', nargs='*', metavar='name',
+                        help=f"benchmarks to run: suite or {', '.join(BENCHMARKS)} (default: all but suite)")
+    parser.add_argument('--scale', type=float, default=1.0, help='suite workload size factor')
+    parser.add_argument('--repeat', type=int, default=3, help='suite runs per stage, best is kept')
+    parser.add_argument('--save', metavar='FILE', help='write suite results to a baseline JSON file')
+    parser.add_argument('--baseline', metavar='FILE', help='compare suite results with a baseline JSON file')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='slowdown against the baseline reported as a regression (default: 0.1)')
+    args = parser.parse_args()
+    # Checked here rather than with choices=, which also checks the empty
+    # default list against the choices on some Python versions, e.g. 3.11
+    unknown = [name for name in args.names if name != 'suite' and name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark {', '.join(unknown)} (choose from suite, {', '.join(BENCHMARKS)})")
+    
+    exit_code = 0
+    for name in args.names or list(BENCHMARKS):
+        print(f"\n== {name} ==")
+        if name != 'suite':
+            BENCHMARKS[name]()
+            continue
+        
+        baseline = None
+        if args.baseline:
+            with open(args.baseline) as file:
+                saved = json.load(file)
+            if saved.get('scale') != args.scale:
+                print(f"warning: baseline was recorded at scale {saved.get('scale')}")
+            baseline = saved['results']
+        
+        results = run_suite(args.scale, args.repeat)
+        regressions = print_suite(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} stage(s) slower than the baseline by more than "
+                  f"{args.threshold:.0%}")
+            exit_code = 1
+        
+        if args.save:
+            with open(args.save, 'w') as file:
+                json.dump({'scale': args.scale, 'results': results}, file, indent=2)
+            print(f"saved results to {args.save}")
+    
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
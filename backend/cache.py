@@ -0,0 +1,149 @@
+# Result cache for repeated expressions
+# Keeps analysis results in an LRU bounded by entry count and size, with an
+# optional time to live, keyed by a hash of the expression text
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from json_stream import encode_analysis
+from lexical_analyzer import DEFAULT_SECTIONS, run_analysis
+
+# Rough size of one cached result dict per token, used when results are
+# cached as dicts rather than JSON bytes
+ESTIMATED_DICT_BYTES_PER_TOKEN = 1024
+
+
+def analysis_dict(text):
+    """Return the analyze_expression result dict for text"""
+    return run_analysis(text).to_dict()
+
+
+def analysis_json(text, parser='iterative', sections=DEFAULT_SECTIONS):
+    """Return the analyze_expression result for text as UTF-8 JSON bytes
+    
+    The JSON is written by analysis_pieces(), which unlike json.dumps() is
+    not limited in the depth of the parse tree.
+    """
+    return encode_analysis(run_analysis(text, parser=parser, sections=sections)).encode('utf-8')
+
+
+def expression_key(text):
+    """Return the cache key of an expression
+    
+    The text is used exactly as given: whitespace moves token positions, so
+    two spellings of the same expression do not share a result.
+    """
+    return hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+
+class ResultCache:
+    """LRU/TTL cache in front of the analyzer
+    
+    With cache_json, results are stored as the serialized JSON bytes and
+    hits are served by analyze_json() without serializing again. Otherwise
+    result dicts are stored; they are shared between callers and must not be
+    modified.
+    """
+    def __init__(self, max_entries=1024, max_bytes=64 * 2 ** 20, ttl=None, cache_json=False):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.cache_json = cache_json
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.lock = threading.Lock()
+    
+    def get(self, key):
+        """Return the cached value for key, or None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            value, size, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self.entries[key]
+                self.size -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+            
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def put(self, key, value, size):
+        """Store value under key, evicting least recently used entries"""
+        if size > self.max_bytes or self.max_entries <= 0:
+            return
+        
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            
+            self.entries[key] = (value, size, expires_at)
+            self.size += size
+            
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                _, (_, evicted_size, _) = self.entries.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+    
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+    
+    def analyze(self, text, compute=analysis_dict):
+        """Return the analyze_expression result dict for text
+        
+        compute(text) produces the result on a miss, for example by running
+        analysis_dict in a worker pool.
+        """
+        if self.cache_json:
+            raise ValueError("This cache stores JSON; use analyze_json()")
+        
+        key = expression_key(text)
+        result = self.get(key)
+        if result is None:
+            result = compute(text)
+            size = ESTIMATED_DICT_BYTES_PER_TOKEN * (len(result.get('tokens', ())) + 1)
+            self.put(key, result, size)
+        return result
+    
+    def analyze_json(self, text, compute=analysis_json):
+        """Return the analyze_expression result for text as UTF-8 JSON bytes
+        
+        compute(text) produces the bytes on a miss, see analyze().
+        """
+        if not self.cache_json:
+            raise ValueError("This cache stores dicts; use analyze()")
+        
+        key = expression_key(text)
+        data = self.get(key)
+        if data is None:
+            data = compute(text)
+            self.put(key, data, len(data))
+        return data
+    
+    def stats(self):
+        """Return the cache counters"""
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
@@ -0,0 +1,208 @@
+# Evaluation of accepted expressions over identifier bindings
+# An expression is compiled once from its abstract syntax tree, into a flat
+# postfix instruction list and into a Python closure. Identifiers made of
+# decimal digits are constants; the others are variables, numbered in the
+# order of the symbol table, whose values are passed per evaluation. Batch
+# evaluation runs the instruction list once over whole NumPy arrays, one
+# array per variable, instead of once per row.
+
+from operator import itemgetter
+
+from lexical_analyzer import NullSymbolTable, SymbolTable, build_ast, run_analysis
+
+# Instruction opcodes; LOAD takes a variable number and CONST a value
+LOAD, CONST, ADD, MUL = range(4)
+
+# Expressions whose closures would nest deeper than this are evaluated by
+# the instruction list instead, since each level is a nested call
+MAX_CLOSURE_DEPTH = 200
+
+
+def _operands(node):
+    """Return the operands of a chain of node's operator, left to right
+    
+    PLUS and MULT are associative, so a+b+c is one three-operand sum
+    rather than two nested ones.
+    """
+    operands = []
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if current.name == node.name:
+            stack.extend(reversed(current.children))
+        else:
+            operands.append(current)
+    return operands
+
+
+def compile_instructions(ast, columns):
+    """Return the postfix instruction list of an abstract syntax tree"""
+    instructions = []
+    # Each entry is a node to emit, or an operator node whose operands have
+    # already been emitted
+    stack = [(ast, False)]
+    while stack:
+        node, operands_done = stack.pop()
+        if node.name == 'ID':
+            if node.value.isdecimal():
+                instructions.append((CONST, int(node.value)))
+            else:
+                instructions.append((LOAD, columns[node.value]))
+        elif operands_done:
+            instructions.append((ADD if node.name == 'PLUS' else MUL, None))
+        else:
+            stack.append((node, True))
+            stack.append((node.children[1], False))
+            stack.append((node.children[0], False))
+    return instructions
+
+
+def closure_depth(ast):
+    """Return how deeply compile_closure() nests the functions for ast"""
+    depth = 0
+    stack = [(ast, 1)]
+    while stack:
+        node, level = stack.pop()
+        depth = max(depth, level)
+        if node.name != 'ID':
+            stack.extend((operand, level + 1) for operand in _operands(node))
+    return depth
+
+
+def compile_closure(ast, columns):
+    """Return a function of the variable values that evaluates ast"""
+    if ast.name == 'ID':
+        if ast.value.isdecimal():
+            value = int(ast.value)
+            return lambda values: value
+        return itemgetter(columns[ast.value])
+    
+    functions = [compile_closure(operand, columns) for operand in _operands(ast)]
+    if len(functions) == 2:
+        left, right = functions
+        if ast.name == 'PLUS':
+            return lambda values: left(values) + right(values)
+        return lambda values: left(values) * right(values)
+    
+    first, rest = functions[0], functions[1:]
+    if ast.name == 'PLUS':
+        def add(values):
+            result = first(values)
+            for function in rest:
+                result = result + function(values)
+            return result
+        return add
+    
+    def multiply(values):
+        result = first(values)
+        for function in rest:
+            result = result * function(values)
+        return result
+    return multiply
+
+
+def run_instructions(instructions, values):
+    """Evaluate a postfix instruction list with a value stack"""
+    stack = []
+    push = stack.append
+    pop = stack.pop
+    for opcode, argument in instructions:
+        if opcode == LOAD:
+            push(values[argument])
+        elif opcode == CONST:
+            push(argument)
+        elif opcode == ADD:
+            right = pop()
+            stack[-1] = stack[-1] + right
+        else:
+            right = pop()
+            stack[-1] = stack[-1] * right
+    return stack[0]
+
+
+class CompiledExpression:
+    """An accepted expression compiled for repeated evaluation
+    
+    variables lists the identifiers that need a value, in symbol table
+    order; evaluate() takes them as a mapping from name to value.
+    """
+    def __init__(self, ast, symbol_table):
+        self.variables = [name for name in symbol_table.get_table() if not name.isdecimal()]
+        columns = {name: column for column, name in enumerate(self.variables)}
+        self.instructions = compile_instructions(ast, columns)
+        if closure_depth(ast) <= MAX_CLOSURE_DEPTH:
+            self.function = compile_closure(ast, columns)
+        else:
+            instructions = self.instructions
+            self.function = lambda values: run_instructions(instructions, values)
+    
+    def values(self, bindings):
+        """Return the values of the variables in column order"""
+        try:
+            return [bindings[name] for name in self.variables]
+        except KeyError as e:
+            raise ValueError(f"No value for identifier {e.args[0]!r}")
+    
+    def evaluate(self, bindings):
+        """Return the value of the expression for one set of bindings"""
+        return self.function(self.values(bindings))
+    
+    def evaluate_batch(self, bindings):
+        """Evaluate over arrays of values, one array per variable
+        
+        Returns a NumPy array with one value per row, or a single value
+        for an expression without variables. Every operation runs
+        once over whole arrays, and intermediate results are overwritten
+        in place where their type allows it.
+        """
+        import numpy
+        
+        values = [numpy.asarray(value) for value in self.values(bindings)]
+        stack = []
+        # Whether each stack entry is an intermediate result that can be
+        # overwritten, as opposed to an input array or a constant
+        owned = []
+        for opcode, argument in self.instructions:
+            if opcode == LOAD:
+                stack.append(values[argument])
+                owned.append(False)
+            elif opcode == CONST:
+                stack.append(argument)
+                owned.append(False)
+            else:
+                ufunc = numpy.add if opcode == ADD else numpy.multiply
+                right = stack.pop()
+                right_owned = owned.pop()
+                left = stack[-1]
+                dtype = numpy.result_type(left, right)
+                if owned[-1] and left.dtype == dtype and left.shape == numpy.broadcast(left, right).shape:
+                    ufunc(left, right, out=left)
+                elif right_owned and right.dtype == dtype and right.shape == numpy.broadcast(left, right).shape:
+                    stack[-1] = ufunc(left, right, out=right)
+                else:
+                    stack[-1] = ufunc(left, right)
+                owned[-1] = isinstance(stack[-1], numpy.ndarray)
+        
+        result = numpy.asarray(stack[0])
+        if values and result.ndim == 0:
+            # An expression of constants only has one value for every row
+            result = numpy.full(numpy.broadcast(*values).shape, result)
+        return result
+
+
+def compile_analysis(analysis):
+    """Compile an accepted Analysis; raises ValueError for rejected ones"""
+    if not analysis.is_accepted:
+        raise ValueError(f"Only accepted expressions can be compiled: {analysis.error}")
+    ast = analysis.ast if analysis.ast is not None else build_ast(analysis.tokens)
+    symbol_table = analysis.symbol_table
+    if isinstance(symbol_table, NullSymbolTable):
+        symbol_table = SymbolTable()
+        for token in analysis.tokens:
+            symbol_table.add_symbol(token)
+    return CompiledExpression(ast, symbol_table)
+
+
+def compile_expression(text):
+    """Analyze and compile an expression; raises ValueError if rejected"""
+    return compile_analysis(run_analysis(text, sections=('symbols', 'ast')))
@@ -0,0 +1,10 @@
+# Random ids of stored documents and parse trees
+# They come from os.urandom() rather than uuid, whose import slows cold
+# starts of the API
+
+import os
+
+
+def new_id():
+    """Return a random id of 32 hex digits"""
+    return os.urandom(16).hex()
@@ -0,0 +1,442 @@
+# Incremental re-analysis of edited documents
+# A Document keeps the tokens, parse tree and symbol table of its text and
+# applies edits by re-lexing only the tokens around the edit and re-parsing
+# only the terms or factors next to them, which are spliced into the chain
+# of E' or T' nodes they belong to
+
+import re
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from itertools import chain, islice
+
+from ids import new_id
+from lexical_analyzer import Analysis, IterativeParser, Lexer, SymbolTable, Token, TokenStream
+
+TERMINALS = ('PLUS', 'MULT', 'LPAREN', 'RPAREN', 'ID')
+# Terminals that start an E', T' or F node
+HEADS = ('PLUS', 'MULT', 'LPAREN')
+
+
+def _line_starts(text):
+    return [0] + [m.end() for m in re.finditer('\n', text)]
+
+
+def _index_tree(root, tokens, start):
+    """Pair the terminal leaves under root with tokens[start:]
+    
+    Returns the leaf nodes in token order and a map from each PLUS, MULT
+    and LPAREN token to the E', T' or F node it starts.
+    """
+    leaves = []
+    nodes = {}
+    stack = [(root, None)]
+    
+    while stack:
+        node, parent = stack.pop()
+        if node.name in TERMINALS:
+            token = tokens[start + len(leaves)]
+            leaves.append(node)
+            if node.name in HEADS:
+                nodes[token] = parent
+        else:
+            stack.extend((child, node) for child in reversed(node.children))
+    
+    return leaves, nodes
+
+
+def _chain_bound(tokens, i, step, operators):
+    # Walk from tokens[i] in the direction of step, over whole parenthesized
+    # groups, to the first of operators or the enclosing parenthesis. Returns
+    # -1 or len(tokens) when there is none.
+    inner, outer = ('RPAREN', 'LPAREN') if step < 0 else ('LPAREN', 'RPAREN')
+    depth = 0
+    while 0 <= i < len(tokens):
+        kind = tokens[i].type
+        if kind == inner:
+            depth += 1
+        elif kind == outer:
+            if not depth:
+                break
+            depth -= 1
+        elif not depth and kind in operators:
+            break
+        i += step
+    return i
+
+
+def _span_shape(tokens):
+    # Whether the parentheses in tokens are balanced, and whether there is a
+    # PLUS outside them
+    depth = 0
+    plus = False
+    for token in tokens:
+        kind = token.type
+        if kind == 'LPAREN':
+            depth += 1
+        elif kind == 'RPAREN':
+            depth -= 1
+            if depth < 0:
+                return False, plus
+        elif kind == 'PLUS' and not depth:
+            plus = True
+    return depth == 0, plus
+
+
+class Document:
+    """An expression whose analysis is kept up to date across edits
+    
+    Edits and reads of a document are serialized by its lock. Token and
+    line start offsets are stored gap-buffer style: those before the last
+    edit count from the start of the text and those after it from the end,
+    as negative numbers, so an edit only converts the offsets between it
+    and the previous edit. Token positions and the symbol table order are
+    brought up to date when the full result is read.
+    """
+    def __init__(self, text):
+        self.version = 0
+        self.lock = threading.Lock()
+        self.analyze_all(text)
+    
+    def analyze_all(self, text):
+        """Lex and parse the whole text"""
+        self.text = text
+        self.line_starts = _line_starts(text)
+        self.line_gap = len(self.line_starts)
+        lexer = Lexer(text)
+        try:
+            tokens = lexer.tokenize()
+        except Exception as e:
+            self.analysis = Analysis(text)
+            self.analysis.error = str(e)
+            self.leaves = []
+            self.nodes = {}
+            self.first_tokens = {}
+            self.gap = 0
+            self.stale = self.reorder = False
+            return
+        
+        for token in tokens:
+            line, column = token.position
+            token.start = self.line_starts[line - 1] + column - 1
+        self.gap = len(tokens)
+        self.parse_all(tokens, lexer.eof_token)
+    
+    def parse_all(self, tokens, eof_token):
+        """Parse an already lexed token list with up to date positions"""
+        analysis = Analysis(self.text)
+        analysis.symbol_table = SymbolTable()
+        parser = IterativeParser(TokenStream(tokens, eof_token), analysis.symbol_table)
+        analysis.parse_tree, analysis.is_accepted, analysis.error = parser.parse()
+        analysis.tokens = tokens
+        self.analysis = analysis
+        self.eof_token = eof_token
+        self.stale = self.reorder = False
+        
+        self.first_tokens = {}
+        for token in tokens:
+            if token.type == 'ID':
+                self.first_tokens.setdefault(token.value, token)
+        
+        if analysis.is_accepted:
+            self.leaves, self.nodes = _index_tree(analysis.parse_tree, tokens, 0)
+        else:
+            self.leaves = []
+            self.nodes = {}
+    
+    def to_dict(self):
+        with self.lock:
+            self._update_positions()
+            return self.analysis.to_dict()
+    
+    def _absolute(self, start):
+        return start if start >= 0 else start + len(self.text) + 1
+    
+    def offset(self, token):
+        return self._absolute(token.start)
+    
+    def _position(self, offset):
+        line = bisect_right(self.line_starts, offset, key=self._absolute)
+        return (line, offset - self._absolute(self.line_starts[line - 1]) + 1)
+    
+    def _move_gap(self, index):
+        # Store tokens[:index] from the start and the rest from the end
+        tokens = self.analysis.tokens
+        size = len(self.text) + 1
+        for i in range(self.gap, index):
+            tokens[i].start += size
+        for i in range(index, self.gap):
+            tokens[i].start -= size
+        self.gap = index
+    
+    def _move_line_gap(self, index):
+        line_starts = self.line_starts
+        size = len(self.text) + 1
+        for i in range(self.line_gap, index):
+            line_starts[i] += size
+        for i in range(index, self.line_gap):
+            line_starts[i] -= size
+        self.line_gap = index
+    
+    def _update_positions(self):
+        # Set the (line, column) of every token, the first positions of the
+        # symbols and the table's first occurrence order after edits
+        if not self.stale:
+            return
+        line_starts = [self._absolute(start) for start in self.line_starts]
+        line = 1
+        for token in self.analysis.tokens:
+            offset = self.offset(token)
+            while line < len(line_starts) and line_starts[line] <= offset:
+                line += 1
+            token.position = (line, offset - line_starts[line - 1] + 1)
+        
+        symbol_table = self.analysis.symbol_table
+        first_tokens = self.first_tokens
+        if self.reorder:
+            symbol_table.symbols = dict(sorted(symbol_table.symbols.items(),
+                                               key=lambda item: self.offset(first_tokens[item[0]])))
+        for name, symbol in symbol_table.symbols.items():
+            symbol['first_position'] = first_tokens[name].position
+        self.stale = self.reorder = False
+    
+    def edit(self, offset, deleted, inserted):
+        """Replace deleted characters at offset with inserted and re-analyze
+        
+        Returns a description of the change: the mode used ('tokens' when
+        only token values changed, 'chain' when the terms or factors around
+        the edit were re-parsed and spliced into the tree, 'document' when
+        all tokens were re-parsed, 'full' when the whole text was re-lexed)
+        and the replaced token window.
+        """
+        with self.lock:
+            text = self.text
+            if offset < 0 or deleted < 0 or offset + deleted > len(text):
+                raise ValueError(f"Edit ({offset}, {deleted}) is outside the document of length {len(text)}")
+            
+            new_text = text[:offset] + inserted + text[offset + deleted:]
+            self.version += 1
+            
+            change = None
+            if self.analysis.is_accepted:
+                change = self._edit_tokens(offset, deleted, inserted, new_text)
+            if change is None:
+                self.analyze_all(new_text)
+                change = {'mode': 'full', 'start': 0, 'removed': None,
+                          'tokens': self.analysis.tokens}
+            return change
+    
+    def _edit_tokens(self, offset, deleted, inserted, new_text):
+        # Returns None when the edit has to be handled by a full analysis
+        tokens = self.analysis.tokens
+        edit_end = offset + deleted
+        delta = len(inserted) - deleted
+        
+        # The window covers the tokens the edit touches plus any identifier
+        # directly next to it, which the edit could extend or merge with.
+        # Operators and parentheses are single characters that never merge,
+        # so an adjacent one stays outside the window.
+        a = bisect_left(tokens, offset, key=self.offset) - 1
+        if a < 0:
+            a = 0
+            region_start = 0
+        else:
+            token = tokens[a]
+            region_start = self.offset(token)
+            token_end = region_start + len(token.value)
+            if token_end < offset or (token_end == offset and token.type != 'ID'):
+                a += 1
+                region_start = token_end
+        
+        b = bisect_right(tokens, edit_end, key=self.offset)
+        if b > a and tokens[b - 1].type != 'ID' and self.offset(tokens[b - 1]) == edit_end:
+            b -= 1
+        region_end = self.offset(tokens[b]) if b < len(tokens) else len(self.text)
+        
+        window_text = new_text[region_start:region_end + delta]
+        try:
+            window = Lexer(window_text).tokenize()
+        except Exception:
+            return None
+        
+        window_starts = _line_starts(window_text)
+        for token in window:
+            line, column = token.position
+            token.start = region_start + window_starts[line - 1] + column - 1
+        
+        # Offsets after the edit are kept from the end, which the edit
+        # leaves unchanged, so the gaps move to the edit before the text
+        # changes length
+        self._move_gap(b)
+        line_first = bisect_right(self.line_starts, offset, key=self._absolute)
+        line_last = bisect_right(self.line_starts, edit_end, key=self._absolute)
+        self._move_line_gap(line_last)
+        new_lines = [offset + m.end() for m in re.finditer('\n', inserted)]
+        self.line_starts[line_first:line_last] = new_lines
+        self.line_gap = line_first + len(new_lines)
+        
+        removed = tokens[a:b]
+        tokens[a:b] = window
+        window_end = a + len(window)
+        self.gap = window_end
+        self.text = new_text
+        self.analysis.text = new_text
+        self.stale = True
+        for token in window:
+            token.position = self._position(token.start)
+        self.eof_token = Token('EOF', None, self._position(len(new_text)))
+        
+        if [t.type for t in removed] == [t.type for t in window]:
+            # Same token types: the tree keeps its shape, only leaf values change
+            for leaf, token in zip(self.leaves[a:b], window):
+                leaf.value = token.value
+            for old, new in zip(removed, window):
+                if old.type in HEADS:
+                    self.nodes[new] = self.nodes.pop(old)
+            mode = 'tokens'
+        else:
+            mode = self._splice(tokens, a, b, window_end, removed)
+            if mode is None:
+                self._update_positions()
+                self.parse_all(tokens, self.eof_token)
+                return {'mode': 'document', 'start': a, 'removed': b - a, 'tokens': window}
+        
+        self._update_symbols(tokens, window_end, removed, window)
+        return {'mode': mode, 'start': a, 'removed': b - a, 'tokens': window}
+    
+    def _splice(self, tokens, a, b, window_end, removed):
+        # Re-parse the tokens between the operators or parentheses around the
+        # window and put the result in place of the items they replace. That
+        # is the factors between two MULTs, or a MULT and the end of a term,
+        # when no PLUS is removed or added; otherwise the terms between PLUS
+        # tokens or the parentheses of the group.
+        l = _chain_bound(tokens, a - 1, -1, ('PLUS', 'MULT'))
+        r = _chain_bound(tokens, window_end, 1, ('PLUS', 'MULT'))
+        balanced, old_plus = _span_shape(chain(tokens[l + 1:a], removed, tokens[window_end:r]))
+        if not balanced:
+            return None
+        new_plus = _span_shape(tokens[l + 1:r])[1]
+        
+        left = tokens[l] if l >= 0 else None
+        right = tokens[r] if r < len(tokens) else None
+        op = 'MULT'
+        bounds = [token.type for token in (left, right) if token is not None]
+        if old_plus or new_plus or 'MULT' not in bounds:
+            op = 'PLUS'
+            if left is not None and left.type == 'MULT':
+                l = _chain_bound(tokens, l - 1, -1, ('PLUS',))
+                left = tokens[l] if l >= 0 else None
+            if right is not None and right.type == 'MULT':
+                r = _chain_bound(tokens, r + 1, 1, ('PLUS',))
+                right = tokens[r] if r < len(tokens) else None
+        
+        parser = IterativeParser(TokenStream(tokens[l + 1:r], self.eof_token), SymbolTable())
+        expr, is_accepted, error = parser.parse()
+        if not is_accepted:
+            return None
+        
+        # An E for terms, or the T of one when splicing factors
+        unit = expr if op == 'PLUS' else expr.children[0]
+        leaves, nodes = _index_tree(unit, tokens, l + 1)
+        
+        # The chain continues with the old node of the operator on the right
+        if right is not None and right.type == op:
+            node, index = unit, 1
+            while len(node.children[index].children) == 3:
+                node, index = node.children[index], 2
+            node.children[index] = self.nodes[right]
+        
+        if left is not None and left.type == op:
+            self.nodes[left].children[1:] = unit.children
+        elif left is not None and left.type == 'PLUS':
+            self.nodes[left].children[1] = unit
+        elif left is not None:
+            group = self.nodes[left]
+            if op == 'PLUS':
+                group.children[1] = unit
+            else:
+                group.children[1].children[0] = unit
+        elif op == 'PLUS':
+            self.analysis.parse_tree = unit
+        else:
+            self.analysis.parse_tree.children[0] = unit
+        
+        for token in chain(tokens[l + 1:a], removed, tokens[window_end:r]):
+            if token.type in HEADS:
+                del self.nodes[token]
+        old_r = r - (window_end - a) + (b - a)
+        self.leaves[l + 1:old_r] = leaves
+        self.nodes.update(nodes)
+        return 'chain'
+    
+    def _update_symbols(self, tokens, window_end, removed, added):
+        # Entries are changed in place. A name whose first occurrence was
+        # removed moves it to the next occurrence after the window; the
+        # table is put back in first occurrence order when it is read.
+        symbol_table = self.analysis.symbol_table
+        symbols = symbol_table.symbols
+        first_tokens = self.first_tokens
+        
+        for token in removed:
+            if token.type == 'ID':
+                symbols[token.value]['occurrences'] -= 1
+        for token in removed:
+            if token.type == 'ID':
+                name = token.value
+                if name not in symbols:
+                    continue
+                if not symbols[name]['occurrences']:
+                    del symbols[name]
+                    del first_tokens[name]
+                elif first_tokens[name] is token:
+                    first_tokens[name] = next(t for t in islice(tokens, window_end, None)
+                                              if t.type == 'ID' and t.value == name)
+                    self.reorder = True
+        
+        for token in added:
+            if token.type == 'ID':
+                name = token.value
+                if name not in symbols:
+                    symbol_table.add_symbol(token)
+                    first_tokens[name] = token
+                    self.reorder = True
+                else:
+                    symbols[name]['occurrences'] += 1
+                    if token.start < self.offset(first_tokens[name]):
+                        first_tokens[name] = token
+                        self.reorder = True
+
+
+class DocumentStore:
+    """Documents by id, keeping the most recently used max_documents"""
+    def __init__(self, max_documents=256):
+        self.max_documents = max_documents
+        self.documents = OrderedDict()
+        self.lock = threading.Lock()
+    
+    def create(self, text):
+        document_id = new_id()
+        document = Document(text)
+        with self.lock:
+            self.documents[document_id] = document
+            while len(self.documents) > self.max_documents:
+                self.documents.popitem(last=False)
+        return document_id, document
+    
+    def get(self, document_id):
+        with self.lock:
+            document = self.documents.get(document_id)
+            if document is not None:
+                self.documents.move_to_end(document_id)
+            return document
+    
+    def edit(self, document_id, offset, deleted, inserted):
+        """Apply an edit and return (document, change), or (None, None)
+        
+        Only the lookup holds the store's lock; the edit holds the
+        document's own, so edits to different documents run concurrently.
+        """
+        document = self.get(document_id)
+        if document is None:
+            return None, None
+        return document, document.edit(offset, deleted, inserted)
@@ -0,0 +1,201 @@
+# Opt-in per-stage instrumentation of the analyzer
+# When enabled, every run_analysis() call gets a Recorder that measures the
+# wall and CPU time of each stage (lex, parse, to_dict, and jsonify in the API),
+# counts tokens and parse tree nodes, and feeds the process-wide Metrics
+# rendered by /api/metrics. When disabled, run_analysis() only checks that
+# lexical_analyzer.recorder_factory is None.
+
+import threading
+import time
+import tracemalloc
+
+import lexical_analyzer
+
+# Upper bounds of the latency histogram buckets in seconds
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def count_nodes(root):
+    """Return the number of nodes in a parse tree"""
+    if root is None:
+        return 0
+    tree = getattr(root, 'tree', None)
+    if tree is not None:
+        return len(tree)
+    
+    count = 0
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(node.children)
+    return count
+
+
+class Histogram:
+    """Cumulative Prometheus histogram over fixed buckets"""
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+    
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Process-wide totals and latency histograms of instrumented calls"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        self.wall = {}
+        self.cpu = {}
+        self.allocated = {}
+        self.analyses = 0
+        self.accepted = 0
+        self.tokens = 0
+        self.nodes = 0
+    
+    def observe_stage(self, stage, wall, cpu, allocated):
+        with self.lock:
+            histogram = self.wall.get(stage)
+            if histogram is None:
+                histogram = self.wall[stage] = Histogram()
+            histogram.observe(wall)
+            self.cpu[stage] = self.cpu.get(stage, 0.0) + cpu
+            if allocated is not None:
+                self.allocated[stage] = self.allocated.get(stage, 0) + allocated
+    
+    def observe_analysis(self, is_accepted, tokens, nodes):
+        with self.lock:
+            self.analyses += 1
+            self.accepted += is_accepted
+            self.tokens += tokens
+            self.nodes += nodes
+    
+    def render(self):
+        """Return the metrics in the Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            lines.append('# HELP analyzer_stage_seconds Wall time spent in each analysis stage')
+            lines.append('# TYPE analyzer_stage_seconds histogram')
+            for stage, histogram in self.wall.items():
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'analyzer_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'analyzer_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                lines.append(f'analyzer_stage_seconds_sum{{stage="{stage}"}} {histogram.sum!r}')
+                lines.append(f'analyzer_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+            
+            lines.append('# HELP analyzer_stage_cpu_seconds_total CPU time spent in each analysis stage')
+            lines.append('# TYPE analyzer_stage_cpu_seconds_total counter')
+            for stage, seconds in self.cpu.items():
+                lines.append(f'analyzer_stage_cpu_seconds_total{{stage="{stage}"}} {seconds!r}')
+            
+            if self.allocated:
+                lines.append('# HELP analyzer_stage_allocated_bytes_total Peak bytes allocated in each analysis stage')
+                lines.append('# TYPE analyzer_stage_allocated_bytes_total counter')
+                for stage, size in self.allocated.items():
+                    lines.append(f'analyzer_stage_allocated_bytes_total{{stage="{stage}"}} {size}')
+            
+            for name, value, help_text in (
+                ('analyzer_analyses_total', self.analyses, 'Expressions analyzed'),
+                ('analyzer_accepted_total', self.accepted, 'Expressions accepted by the parser'),
+                ('analyzer_tokens_total', self.tokens, 'Tokens produced by the lexer'),
+                ('analyzer_parse_tree_nodes_total', self.nodes, 'Parse tree nodes built'),
+            ):
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} counter')
+                lines.append(f'{name} {value}')
+        
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+class Recorder:
+    """Stage measurements of one analysis
+    
+    Stages run one after another: start() begins a stage and ends the
+    running one, stop() ends the running one. Allocated bytes are the
+    tracemalloc peak during a stage and are only recorded when memory
+    tracing is on; with concurrent requests they include the allocations of
+    other threads.
+    """
+    def __init__(self, metrics, trace_memory=False):
+        self.metrics = metrics
+        self.trace_memory = trace_memory
+        self.stages = {}
+        self.tokens = 0
+        self.nodes = 0
+        self.stage = None
+    
+    def start(self, stage):
+        if self.stage is not None:
+            self.stop()
+        self.stage = stage
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            self.memory = tracemalloc.get_traced_memory()[0]
+        self.cpu = time.thread_time()
+        self.wall = time.perf_counter()
+    
+    def stop(self):
+        stage = self.stage
+        if stage is None:
+            return
+        wall = time.perf_counter() - self.wall
+        cpu = time.thread_time() - self.cpu
+        self.stage = None
+        
+        allocated = None
+        if self.trace_memory:
+            allocated = max(0, tracemalloc.get_traced_memory()[1] - self.memory)
+        self.stages[stage] = {'wall_ms': wall * 1000, 'cpu_ms': cpu * 1000,
+                              'allocated_bytes': allocated}
+        self.metrics.observe_stage(stage, wall, cpu, allocated)
+    
+    def finish(self, analysis):
+        """Count the tokens and tree nodes of a finished analysis"""
+        self.tokens = len(analysis.tokens) if analysis.tokens is not None else 0
+        self.nodes = count_nodes(analysis.parse_tree)
+        self.metrics.observe_analysis(analysis.is_accepted, self.tokens, self.nodes)
+    
+    def to_dict(self):
+        return {
+            'stages': self.stages,
+            'tokens': self.tokens,
+            'nodes': self.nodes
+        }
+
+
+def enable(trace_memory=False):
+    """Instrument every following run_analysis() call
+    
+    trace_memory starts tracemalloc to record allocated bytes per stage,
+    which slows the analyzer down several times.
+    """
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    lexical_analyzer.recorder_factory = lambda: Recorder(metrics, trace_memory)
+
+
+def disable():
+    lexical_analyzer.recorder_factory = None
+
+
+def is_enabled():
+    return lexical_analyzer.recorder_factory is not None
@@ -0,0 +1,170 @@
+# Streaming JSON serialization of analysis results
+# Writes JSON text straight from tokens, symbol tables and parse trees instead
+# of building the nested dictionaries from Analysis.to_dict() first
+
+import json
+
+# Pieces are joined and yielded once this many characters are buffered
+CHUNK_SIZE = 64 * 1024
+
+_encode = json.JSONEncoder(separators=(',', ':')).encode
+
+
+def tree_pieces(root):
+    """Yield the JSON of Node.to_dict() for root piece by piece"""
+    # None on the stack closes the children list of the node opened before it
+    stack = [root]
+    first = True
+    
+    while stack:
+        node = stack.pop()
+        if node is None:
+            yield ']}'
+            first = False
+            continue
+        
+        if not first:
+            yield ','
+        yield f'{{"name":{_encode(node.name)},"value":{_encode(node.value)},"children":['
+        first = True
+        
+        stack.append(None)
+        stack.extend(reversed(node.children))
+
+
+def analysis_pieces(analysis):
+    """Yield the JSON of Analysis.to_dict() piece by piece"""
+    yield f'{{"input":{_encode(analysis.text)}'
+    
+    if analysis.tokens is None:
+        yield f',"is_accepted":false,"error":{_encode(analysis.error)}}}'
+        return
+    
+    if 'tokens' in analysis.sections:
+        yield ',"tokens":['
+        for i, token in enumerate(analysis.tokens):
+            line, column = token.position
+            yield (f'{"," if i else ""}{{"type":"{token.type}","value":{_encode(token.value)},'
+                   f'"position":[{line},{column}]}}')
+        yield ']'
+    
+    yield f',"is_accepted":{_encode(analysis.is_accepted)}'
+    if 'symbols' in analysis.sections:
+        yield ',"symbol_table":{'
+        for i, (name, symbol) in enumerate(analysis.symbol_table.get_table().items()):
+            yield f'{"," if i else ""}{_encode(name)}:{_encode(symbol)}'
+        yield '}'
+    if 'occurrences' in analysis.sections:
+        yield f',"occurrences":{_encode(analysis.symbol_table.occurrences())}'
+    yield f',"error":{_encode(analysis.error)}'
+    
+    if analysis.errors is not None:
+        yield f',"errors":{_encode(analysis.errors)}'
+    
+    if analysis.parse_tree and 'cst' in analysis.sections:
+        yield ',"parse_tree":'
+        yield from tree_pieces(analysis.parse_tree)
+    
+    if analysis.dag:
+        yield f',"parse_dag":{_encode(analysis.dag.to_dict())}'
+    
+    if analysis.ast:
+        yield ',"ast":'
+        yield from tree_pieces(analysis.ast)
+    
+    yield '}'
+
+
+def encode_analysis(analysis):
+    """Return the JSON of Analysis.to_dict() as one string
+    
+    An instrumented analysis records the encoding as its jsonify stage.
+    """
+    recorder = analysis.recorder
+    if recorder is None:
+        return ''.join(analysis_pieces(analysis))
+    recorder.start('jsonify')
+    data = ''.join(analysis_pieces(analysis))
+    recorder.stop()
+    return data
+
+
+def chunked(pieces, chunk_size=CHUNK_SIZE):
+    """Join small string pieces into chunks of about chunk_size characters"""
+    buffer = []
+    size = 0
+    
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    
+    if buffer:
+        yield ''.join(buffer)
+
+
+def stream_analysis(analysis):
+    """Yield the JSON of one analysis result in chunks"""
+    return chunked(analysis_pieces(analysis))
+
+
+def stream_results(analyses):
+    """Yield the JSON of {'results': [...]} for an iterable of analyses in chunks"""
+    def pieces():
+        yield '{"results":['
+        for i, analysis in enumerate(analyses):
+            if i:
+                yield ','
+            yield from analysis_pieces(analysis)
+        yield ']}'
+    
+    return chunked(pieces())
+
+
+def stream_encoded_results(results):
+    """Yield the JSON of {'results': [...]} for results that are JSON text"""
+    def pieces():
+        yield '{"results":['
+        for i, result in enumerate(results):
+            if i:
+                yield ','
+            yield result
+        yield ']}'
+    
+    return chunked(pieces())
+
+
+def stream_batch(indexes, results):
+    """Yield the JSON of a deduplicated batch in chunks
+    
+    results are the JSON text of the results, see batch.analysis_text(),
+    and indexes maps each batch item to one of them:
+    {"count": ..., "unique": ..., "items": indexes, "results": results}
+    Since the results are already encoded, nothing can fail once the
+    response has started.
+    """
+    def pieces():
+        yield f'{{"count":{len(indexes)},"unique":{len(results)},"items":{_encode(indexes)},"results":['
+        for i, result in enumerate(results):
+            if i:
+                yield ','
+            yield result
+        yield ']}'
+    
+    return chunked(pieces())
+
+
+def stream_ndjson(analyses):
+    """Yield one line of JSON per analysis, as soon as each one is available
+    
+    A failure while producing the analyses, such as an undecodable upload
+    line, ends the stream with an {"error": ...} line.
+    """
+    try:
+        for analysis in analyses:
+            yield encode_analysis(analysis) + '\n'
+    except Exception as e:
+        yield _encode({'error': str(e)}) + '\n'
@@ -1,6 +1,14 @@
 # Lexical Analyzer and Parser Implementation
 # This program simulates a lexical analyzer and a parser for the given grammar
 
+import re
+from array import array
+from bisect import bisect_left
+from itertools import accumulate
+
+# Token types of the single-character terminals, shared by the lexers
+TOKEN_TYPES = {'+': 'PLUS', '*': 'MULT', '(': 'LPAREN', ')': 'RPAREN'}
+
 class Token:
     def __init__(self, type, value, position):
         self.type = type
@@ -18,16 +26,23 @@ class Token:
         }
 
 class Lexer:
-    def __init__(self, text):
+    def __init__(self, text, recover=False):
         self.text = text
         self.pos = 0
         self.current_char = self.text[self.pos] if len(self.text) > 0 else None
         self.line = 1
         self.column = 1
         self.tokens = []
+        self.eof_token = None
+        # With recover, invalid characters are recorded here and skipped
+        # instead of raising
+        self.errors = [] if recover else None
+    
+    def error_message(self):
+        return f"Invalid character '{self.current_char}' at position {self.pos} (line {self.line}, column {self.column})"
     
     def error(self):
-        raise Exception(f"Invalid character '{self.current_char}' at position {self.pos} (line {self.line}, column {self.column})")
+        raise Exception(self.error_message())
     
     def advance(self):
         if self.current_char == '\n':
@@ -66,27 +81,16 @@ class Lexer:
             if self.current_char.isalnum():
                 return self.id()
             
-            if self.current_char == '+':
-                token = Token('PLUS', '+', (self.line, self.column))
-                self.advance()
-                return token
-            
-            if self.current_char == '*':
-                token = Token('MULT', '*', (self.line, self.column))
+            kind = TOKEN_TYPES.get(self.current_char)
+            if kind is not None:
+                token = Token(kind, self.current_char, (self.line, self.column))
                 self.advance()
                 return token
             
-            if self.current_char == '(':
-                token = Token('LPAREN', '(', (self.line, self.column))
-                self.advance()
-                return token
-            
-            if self.current_char == ')':
-                token = Token('RPAREN', ')', (self.line, self.column))
-                self.advance()
-                return token
-            
-            self.error()
+            if self.errors is None:
+                self.error()
+            self.errors.append(self.error_message())
+            self.advance()
         
         return Token('EOF', None, (self.line, self.column))
     
@@ -99,7 +103,366 @@ class Lexer:
             self.tokens.append(token)
             token = self.get_next_token()
         
+        self.eof_token = token
         return self.tokens
+    
+    def token_stream(self):
+        """Return a stream that replays the tokens produced by tokenize()"""
+        return TokenStream(self.tokens, self.eof_token)
+
+
+class TokenStream:
+    """Serve an already lexed token list through the lexer interface.
+    
+    The parser only needs get_next_token(), so a single tokenize() pass can
+    feed the token listing, the parser and the symbol table alike.
+    """
+    def __init__(self, tokens, eof_token):
+        self.tokens = tokens
+        self.eof_token = eof_token
+        self.pos = 0
+    
+    def get_next_token(self):
+        if self.pos < len(self.tokens):
+            token = self.tokens[self.pos]
+            self.pos += 1
+            return token
+        
+        return self.eof_token
+
+
+class RegexLexer:
+    """Lexer that scans with one precompiled master pattern.
+    
+    Emits the same tokens as Lexer, but matches whole identifiers and skips
+    whitespace runs in a single regex step instead of advancing character by
+    character. Line and column are not tracked per character; they are
+    derived from newline offsets only where a token starts.
+    """
+    # \s and [^\W_] follow str.isspace() and str.isalnum(), the same
+    # character classes Lexer uses
+    TOKEN_PATTERN = re.compile(r'([^\W_]+)|\S')
+    SPLIT_PATTERN = re.compile(r'([^\W_]+|\S)')
+    INVALID_PATTERN = re.compile(r'[^\w\s+*()]|_')
+    NEWLINE_PATTERN = re.compile('\n')
+    TOKEN_TYPES = TOKEN_TYPES
+    
+    def __init__(self, text, recover=False):
+        self.text = text
+        self.pos = 0
+        self.tokens = []
+        self.eof_token = None
+        self.errors = [] if recover else None
+        self.newlines = [m.start() for m in self.NEWLINE_PATTERN.finditer(text)]
+    
+    def position(self, offset):
+        """Return the (line, column) of a character offset"""
+        line = bisect_left(self.newlines, offset)
+        line_start = self.newlines[line - 1] + 1 if line else 0
+        return (line + 1, offset - line_start + 1)
+    
+    def error_message(self, offset):
+        line, column = self.position(offset)
+        return f"Invalid character '{self.text[offset]}' at position {offset} (line {line}, column {column})"
+    
+    def error(self, offset):
+        raise Exception(self.error_message(offset))
+    
+    def get_next_token(self):
+        while True:
+            match = self.TOKEN_PATTERN.search(self.text, self.pos)
+            if match is None:
+                self.pos = len(self.text)
+                return Token('EOF', None, self.position(self.pos))
+            
+            value = match.group()
+            kind = 'ID' if match.lastindex else self.TOKEN_TYPES.get(value)
+            self.pos = match.end()
+            if kind is not None:
+                return Token(kind, value, self.position(match.start()))
+            
+            if self.errors is None:
+                self.error(match.start())
+            self.errors.append(self.error_message(match.start()))
+    
+    def tokenize(self):
+        """Process the entire input and return all tokens"""
+        text = self.text
+        invalid = self.INVALID_PATTERN.search(text)
+        if invalid:
+            if self.errors is None:
+                self.error(invalid.start())
+            # Invalid characters separate tokens just like whitespace
+            self.errors.extend(self.error_message(match.start())
+                               for match in self.INVALID_PATTERN.finditer(text))
+            text = self.INVALID_PATTERN.sub(' ', text)
+        
+        # Splitting on the token pattern yields the whitespace gaps and the
+        # token values alternately, so offsets follow from string lengths and
+        # only gaps containing a newline move the line counter
+        parts = self.SPLIT_PATTERN.split(text)
+        self.tokens = tokens = []
+        token_types = self.TOKEN_TYPES
+        line = 1
+        line_start = 0
+        offset = 0
+        
+        for gap, value in zip(parts[0::2], parts[1::2]):
+            if gap:
+                if '\n' in gap:
+                    line += gap.count('\n')
+                    line_start = offset + gap.rindex('\n') + 1
+                offset += len(gap)
+            tokens.append(Token(token_types.get(value, 'ID'), value, (line, offset - line_start + 1)))
+            offset += len(value)
+        
+        self.pos = len(text)
+        self.eof_token = Token('EOF', None, self.position(self.pos))
+        return tokens
+    
+    def token_stream(self):
+        """Return a stream that replays the tokens produced by tokenize()"""
+        return TokenStream(self.tokens, self.eof_token)
+
+
+class PushLexer:
+    """Lexer that is fed the input in chunks instead of holding all of it.
+    
+    feed() lexes one chunk and returns the tokens it completed; close()
+    ends the input. An identifier at the end of a chunk is only emitted
+    once the next chunk shows where it ends, and line, column and offset
+    carry over between chunks, so the tokens and errors are the same as
+    Lexer's for the concatenated text however it is split.
+    """
+    def __init__(self, recover=False):
+        self.pos = 0
+        self.line = 1
+        self.column = 1
+        self.tokens = []
+        self.eof_token = None
+        self.errors = [] if recover else None
+        # Characters and position of an identifier that may continue in
+        # the next chunk
+        self.identifier = None
+        self.identifier_position = None
+    
+    def feed(self, chunk):
+        """Lex the next chunk of input and return the tokens it completed"""
+        tokens = []
+        pos = self.pos
+        line = self.line
+        column = self.column
+        identifier = self.identifier
+        i = 0
+        length = len(chunk)
+        
+        try:
+            while i < length:
+                char = chunk[i]
+                if char.isalnum():
+                    start = i
+                    i += 1
+                    while i < length and chunk[i].isalnum():
+                        i += 1
+                    if identifier is None:
+                        identifier = chunk[start:i]
+                        self.identifier_position = (line, column)
+                    else:
+                        identifier += chunk[start:i]
+                    pos += i - start
+                    column += i - start
+                    continue
+                
+                if identifier is not None:
+                    tokens.append(Token('ID', identifier, self.identifier_position))
+                    identifier = None
+                
+                if char == '\n':
+                    line += 1
+                    column = 0
+                elif not char.isspace():
+                    kind = TOKEN_TYPES.get(char)
+                    if kind is not None:
+                        tokens.append(Token(kind, char, (line, column)))
+                    else:
+                        message = f"Invalid character '{char}' at position {pos} (line {line}, column {column})"
+                        if self.errors is None:
+                            raise Exception(message)
+                        self.errors.append(message)
+                i += 1
+                pos += 1
+                column += 1
+        finally:
+            self.pos = pos
+            self.line = line
+            self.column = column
+            self.identifier = identifier
+            self.tokens.extend(tokens)
+        
+        return tokens
+    
+    def close(self):
+        """End the input and return the tokens it completed, without EOF"""
+        tokens = []
+        if self.identifier is not None:
+            tokens.append(Token('ID', self.identifier, self.identifier_position))
+            self.tokens.extend(tokens)
+            self.identifier = None
+        self.eof_token = Token('EOF', None, (self.line, self.column))
+        return tokens
+    
+    def token_stream(self):
+        """Return a stream that replays the tokens fed so far"""
+        return TokenStream(self.tokens, self.eof_token)
+
+
+class TokenArray:
+    """Token list over the offsets found by VectorLexer.
+    
+    Behaves like the list of Tokens the other lexers return, but a Token is
+    only built when it is first accessed.
+    """
+    def __init__(self, text, starts, ends, types, lines, columns):
+        self.text = text
+        self.starts = starts
+        self.ends = ends
+        self.types = types
+        self.lines = lines
+        self.columns = columns
+        self.cache = [None] * len(starts)
+    
+    def __len__(self):
+        return len(self.starts)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self.starts)))]
+        
+        token = self.cache[index]
+        if token is None:
+            token = self.cache[index] = Token(self.types[index],
+                                              self.text[self.starts[index]:self.ends[index]],
+                                              (self.lines[index], self.columns[index]))
+        return token
+    
+    def __iter__(self):
+        # Iterating needs every Token, so the missing ones are built at once
+        if None in self.cache:
+            text = self.text
+            self.cache = [token or Token(kind, text[start:end], (line, column))
+                          for token, kind, start, end, line, column
+                          in zip(self.cache, self.types, self.starts, self.ends, self.lines, self.columns)]
+        return iter(self.cache)
+
+
+class VectorLexer:
+    """Lexer that classifies the whole input with NumPy array operations.
+    
+    Emits the same tokens and errors as Lexer. Every character is mapped to
+    a class in one pass, identifiers are the runs of identifier characters,
+    and lines and columns come from a cumulative count of newlines. Only
+    characters outside ASCII are classified one at a time. tokenize()
+    returns a TokenArray, which builds Tokens on access. NumPy is optional:
+    it is imported by the first VectorLexer.
+    """
+    # Character classes; the terminal classes index TYPES
+    SPACE, ID, PLUS, MULT, LPAREN, RPAREN, INVALID = range(7)
+    TYPES = (None, 'ID', 'PLUS', 'MULT', 'LPAREN', 'RPAREN')
+    numpy = None
+    ASCII_CLASSES = None
+    
+    def __init__(self, text, recover=False):
+        if self.numpy is None:
+            self.load_numpy()
+        self.text = text
+        self.pos = 0
+        self.tokens = None
+        self.eof_token = None
+        self.errors = [] if recover else None
+    
+    @classmethod
+    def load_numpy(cls):
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("The numpy lexer requires NumPy; install it with pip install numpy")
+        
+        # Classes of the ASCII characters, plus a placeholder at 128 for
+        # the wider characters that are classified separately
+        classes = numpy.full(129, cls.INVALID, dtype=numpy.uint8)
+        for code in range(128):
+            classes[code] = cls.classify(chr(code))
+        cls.ASCII_CLASSES = classes
+        cls.numpy = numpy
+    
+    @classmethod
+    def classify(cls, char):
+        if char.isspace():
+            return cls.SPACE
+        if char.isalnum():
+            return cls.ID
+        kind = TOKEN_TYPES.get(char)
+        return cls.TYPES.index(kind) if kind is not None else cls.INVALID
+    
+    def error_message(self, offset, line, column):
+        return f"Invalid character '{self.text[offset]}' at position {offset} (line {line}, column {column})"
+    
+    def tokenize(self):
+        """Process the entire input and return all tokens"""
+        np = self.numpy
+        text = self.text
+        codes = np.frombuffer(text.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+        classes = self.ASCII_CLASSES[np.minimum(codes, 128)]
+        for offset in np.flatnonzero(codes >= 128).tolist():
+            classes[offset] = self.classify(text[offset])
+        
+        # Line of an offset: 1 + the newlines before it; column: its distance
+        # from the last of those newlines
+        is_newline = codes == 10
+        newline_counts = np.cumsum(is_newline)
+        newlines = np.concatenate(([-1], np.flatnonzero(is_newline)))
+        
+        def positions(offsets):
+            counts = newline_counts[offsets] - is_newline[offsets]
+            return (counts + 1).tolist(), (offsets - newlines[counts]).tolist()
+        
+        invalid = np.flatnonzero(classes == self.INVALID)
+        if len(invalid):
+            lines, columns = positions(invalid)
+            if self.errors is None:
+                raise Exception(self.error_message(int(invalid[0]), lines[0], columns[0]))
+            self.errors.extend(self.error_message(offset, line, column)
+                               for offset, line, column in zip(invalid.tolist(), lines, columns))
+        
+        # A token starts at every terminal and at the first character of
+        # every run of identifier characters
+        is_id = classes == self.ID
+        edges = np.diff(is_id.view(np.int8), prepend=0, append=0)
+        starts = np.flatnonzero(((classes >= self.PLUS) & (classes <= self.RPAREN)) | (edges[:-1] == 1))
+        types = classes[starts]
+        ends = starts + 1
+        ends[types == self.ID] = np.flatnonzero(edges == -1)
+        
+        lines, columns = positions(starts)
+        type_names = self.TYPES
+        self.tokens = TokenArray(text, starts.tolist(), ends.tolist(),
+                                 [type_names[kind] for kind in types.tolist()], lines, columns)
+        self.eof_token = Token('EOF', None, (len(newlines), len(text) - int(newlines[-1])))
+        return self.tokens
+    
+    def get_next_token(self):
+        if self.tokens is None:
+            self.tokenize()
+        if self.pos < len(self.tokens):
+            token = self.tokens[self.pos]
+            self.pos += 1
+            return token
+        
+        return self.eof_token
+    
+    def token_stream(self):
+        """Return a stream that replays the tokens produced by tokenize()"""
+        return TokenStream(self.tokens, self.eof_token)
 
 
 class SymbolTable:
@@ -129,6 +492,126 @@ class SymbolTable:
         return self.symbols
 
 
+class ColumnarSymbolTable(SymbolTable):
+    """Symbol table that keeps the position of every occurrence.
+    
+    Each distinct name is stored once and numbered in order of first
+    occurrence. Occurrences are rows of array('I') columns (name number,
+    line, column), so memory grows by 12 bytes per identifier and not by a
+    dict per name. get_table() builds the SymbolTable dictionaries on demand.
+    """
+    def __init__(self):
+        self.scope = 'global'
+        self.ids = {}
+        self.names = []
+        self.counts = array('I')
+        self.firsts = array('I')
+        self.name_ids = array('I')
+        self.lines = array('I')
+        self.columns = array('I')
+        # Occurrence rows grouped by name, and where each name's group
+        # starts; rebuilt on demand after symbols were added
+        self.order = None
+        self.offsets = None
+        self.sorted_names = None
+    
+    def add_symbol(self, token):
+        """Add a token to the symbol table."""
+        if token.type != 'ID':
+            return  # Only store identifiers
+        
+        name_id = self.ids.get(token.value)
+        if name_id is None:
+            name_id = self.ids[token.value] = len(self.names)
+            self.names.append(token.value)
+            self.counts.append(0)
+            self.firsts.append(len(self.name_ids))
+            self.sorted_names = None
+        self.counts[name_id] += 1
+        self.name_ids.append(name_id)
+        line, column = token.position
+        self.lines.append(line)
+        self.columns.append(column)
+        self.order = None
+    
+    def __len__(self):
+        return len(self.names)
+    
+    @property
+    def symbols(self):
+        """The dictionaries of SymbolTable.symbols, as built by get_table()
+        
+        Changing them does not change the table.
+        """
+        return self.get_table()
+    
+    def positions(self, name):
+        """Return the (line, column) of every occurrence of name in order"""
+        name_id = self.ids.get(name)
+        if name_id is None:
+            return []
+        
+        self.build_index()
+        lines = self.lines
+        columns = self.columns
+        return [(lines[row], columns[row])
+                for row in self.order[self.offsets[name_id]:self.offsets[name_id + 1]]]
+    
+    def build_index(self):
+        if self.order is None:
+            # A stable sort by name number groups the rows of each name and
+            # keeps them in input order
+            self.order = array('I', sorted(range(len(self.name_ids)), key=self.name_ids.__getitem__))
+            self.offsets = array('I', [0])
+            self.offsets.extend(accumulate(self.counts))
+    
+    def occurrences(self):
+        """Return the positions of every name, in order of first occurrence"""
+        self.build_index()
+        lines = self.lines
+        columns = self.columns
+        order = self.order
+        offsets = self.offsets
+        return {
+            name: [(lines[row], columns[row]) for row in order[offsets[name_id]:offsets[name_id + 1]]]
+            for name_id, name in enumerate(self.names)
+        }
+    
+    def names_with_prefix(self, prefix):
+        """Return the names starting with prefix in sorted order"""
+        if self.sorted_names is None:
+            self.sorted_names = sorted(self.names)
+        
+        names = self.sorted_names
+        matches = []
+        for index in range(bisect_left(names, prefix), len(names)):
+            if not names[index].startswith(prefix):
+                break
+            matches.append(names[index])
+        return matches
+    
+    def get_table(self):
+        """Return the symbol table as a dictionary."""
+        lines = self.lines
+        columns = self.columns
+        return {
+            name: {
+                'type': 'ID',
+                'value': name,
+                'first_position': (lines[first], columns[first]),
+                'occurrences': count,
+                'scope': self.scope
+            }
+            for name, count, first in zip(self.names, self.counts, self.firsts)
+        }
+
+
+class NullSymbolTable(SymbolTable):
+    """Symbol table that records nothing, for analyses that skip symbols"""
+    def add_symbol(self, token):
+        pass
+
+
 class Node:
     def __init__(self, name, value=None, children=None):
         self.name = name
@@ -140,25 +623,145 @@ class Node:
     
     def to_dict(self):
         """Convert node to dictionary for JSON serialization"""
-        return {
-            'name': self.name,
-            'value': self.value,
-            'children': [child.to_dict() for child in self.children]
-        }
+        # Walk with an explicit stack so deep trees do not hit the recursion limit
+        root = {'name': self.name, 'value': self.value, 'children': []}
+        stack = [(self, root)]
+        
+        while stack:
+            node, data = stack.pop()
+            children = data['children']
+            for child in node.children:
+                child_data = {'name': child.name, 'value': child.value, 'children': []}
+                children.append(child_data)
+                stack.append((child, child_data))
+        
+        return root
+
+
+class CompactTree:
+    """Parse tree stored in flat columns instead of one object per node.
+    
+    Node i has a kind code, an index into the shared values list (-1 for no
+    value) and the indexes of its first child, next sibling and last child
+    (-1 for none). CompactNode gives the Node interface over a node index.
+    """
+    KINDS = ('E', "E'", 'T', "T'", 'F', 'Ɛ', 'PLUS', 'MULT', 'LPAREN', 'RPAREN', 'ID')
+    KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+    
+    def __init__(self):
+        self.kinds = array('B')
+        self.value_indexes = array('i')
+        self.first_child = array('i')
+        self.next_sibling = array('i')
+        self.last_child = array('i')
+        self.values = []
+        self.value_codes = {}
+    
+    def __len__(self):
+        return len(self.kinds)
+    
+    def add_node(self, name, value=None, parent=None):
+        """Append a node as the last child of parent and return its index"""
+        index = len(self.kinds)
+        self.kinds.append(self.KIND_CODES[name])
+        
+        if value is None:
+            self.value_indexes.append(-1)
+        else:
+            code = self.value_codes.get(value)
+            if code is None:
+                code = self.value_codes[value] = len(self.values)
+                self.values.append(value)
+            self.value_indexes.append(code)
+        
+        self.first_child.append(-1)
+        self.next_sibling.append(-1)
+        self.last_child.append(-1)
+        
+        if parent is not None:
+            last = self.last_child[parent]
+            if last == -1:
+                self.first_child[parent] = index
+            else:
+                self.next_sibling[last] = index
+            self.last_child[parent] = index
+        
+        return index
+    
+    def node(self, index):
+        return CompactNode(self, index)
+    
+    def name(self, index):
+        return self.KINDS[self.kinds[index]]
+    
+    def value(self, index):
+        code = self.value_indexes[index]
+        return None if code == -1 else self.values[code]
+    
+    def child_indexes(self, index):
+        child = self.first_child[index]
+        while child != -1:
+            yield child
+            child = self.next_sibling[child]
+    
+    def to_dict(self, index=0):
+        """Convert the subtree at index to the same dictionary as Node.to_dict"""
+        root = {'name': self.name(index), 'value': self.value(index), 'children': []}
+        stack = [(index, root)]
+        
+        while stack:
+            node, data = stack.pop()
+            children = data['children']
+            for child in self.child_indexes(node):
+                child_data = {'name': self.name(child), 'value': self.value(child), 'children': []}
+                children.append(child_data)
+                stack.append((child, child_data))
+        
+        return root
+
+
+class CompactNode:
+    """Read-only Node view of one node in a CompactTree"""
+    __slots__ = ('tree', 'index')
+    
+    def __init__(self, tree, index):
+        self.tree = tree
+        self.index = index
+    
+    @property
+    def name(self):
+        return self.tree.name(self.index)
+    
+    @property
+    def value(self):
+        return self.tree.value(self.index)
+    
+    @property
+    def children(self):
+        return [CompactNode(self.tree, child) for child in self.tree.child_indexes(self.index)]
+    
+    def to_dict(self):
+        """Convert node to dictionary for JSON serialization"""
+        return self.tree.to_dict(self.index)
 
 
 class Parser:
+    # Whether parse() keeps going after syntax errors, see RecoveringParser
+    recovers = False
+    
     def __init__(self, lexer, symbol_table):
         self.lexer = lexer
         self.symbol_table = symbol_table
         self.current_token = self.lexer.get_next_token()
         self.errors = []
     
-    def error(self, expected_type=None):
-        error_msg = f"Syntax Error at position {self.current_token.position}"
+    def error_message(self, expected_type=None):
         if expected_type:
-            error_msg = f"Syntax Error: Expected {expected_type}, got {self.current_token.type} at position {self.current_token.position}"
-        
+            return f"Syntax Error: Expected {expected_type}, got {self.current_token.type} at position {self.current_token.position}"
+        return f"Syntax Error at position {self.current_token.position}"
+    
+    def error(self, expected_type=None):
+        error_msg = self.error_message(expected_type)
         self.errors.append(error_msg)
         raise Exception(error_msg)
     
@@ -282,40 +885,576 @@ class Parser:
         return node
 
 
-def analyze_expression(text):
-    """Analyze an expression and return structured results"""
+def _skip_node(name, value, parent):
+    return None
+
+
+class IterativeParser(Parser):
+    """Table-driven LL(1) parser for the same grammar as Parser.
+    
+    Expands productions from an explicit stack instead of recursing once per
+    operator and parenthesis level, so input length and nesting depth are
+    bounded by memory rather than the interpreter recursion limit. Builds the
+    same Node tree and reports the same errors as Parser.
+    """
+    # Productions by nonterminal and lookahead token type; None is the
+    # fallback used when no other entry matches the lookahead
+    PARSE_TABLE = {
+        'E': {None: ('T', "E'")},
+        "E'": {'PLUS': ('PLUS', 'T', "E'"), None: ('Ɛ',)},
+        'T': {None: ('F', "T'")},
+        "T'": {'MULT': ('MULT', 'F', "T'"), None: ('Ɛ',)},
+        'F': {'LPAREN': ('LPAREN', 'E', 'RPAREN'), 'ID': ('ID',)},
+    }
+    
+    # With build_tree False, parse() only recognizes the input and returns
+    # no tree
+    build_tree = True
+    
+    def node_builder(self):
+        """Return add_node(name, value, parent), which creates a tree node
+        and appends it to the children of parent"""
+        if not self.build_tree:
+            return _skip_node
+        
+        def add_node(name, value, parent):
+            node = Node(name, value)
+            if parent is not None:
+                parent.children.append(node)
+            return node
+        
+        return add_node
+    
+    def parse(self):
+        """Parse the input and return the root node of the parse tree."""
+        try:
+            table = self.PARSE_TABLE
+            add_node = self.node_builder()
+            root = None
+            # Each entry is a grammar symbol still to be matched, together
+            # with the node its subtree is attached to
+            stack = [(None, 'E')]
+            pop = stack.pop
+            push = stack.append
+            
+            while stack:
+                parent, symbol = pop()
+                productions = table.get(symbol)
+                
+                if productions is not None:
+                    node = add_node(symbol, None, parent)
+                    if parent is None:
+                        root = node
+                    
+                    production = productions.get(self.current_token.type) or productions.get(None)
+                    if production is None:
+                        self.error("'(' or identifier")
+                    
+                    # Push in reverse so the leftmost symbol is matched first
+                    for child_symbol in reversed(production):
+                        push((node, child_symbol))
+                elif symbol == 'Ɛ':
+                    add_node('Ɛ', None, parent)
+                else:
+                    token = self.eat(symbol)
+                    add_node(symbol, token.value, parent)
+            
+            if self.current_token.type != 'EOF':
+                self.error()
+            
+            return root, True, None
+        except Exception as e:
+            return None, False, str(e)
+
+
+class RecoveringParser(IterativeParser):
+    """IterativeParser that recovers from syntax errors in panic mode.
+    
+    Instead of raising at the first error it records the message in
+    self.errors and resynchronizes: a nonterminal with no production for the
+    lookahead skips tokens until one in its FIRST or FOLLOW set, and a
+    missing terminal skips tokens until that terminal, or is assumed present
+    when the input ends first. Input left over after a complete expression
+    is reported, and the next expression in it is parsed and attached to the
+    root as well. Parsing always runs to the end of the input, so parse()
+    returns every error and the partial tree in one pass; nodes given up on
+    are left without children. Only the first error at any token is
+    reported, which suppresses the cascades a single mistake can cause.
+    """
+    recovers = True
+    
+    FIRST = {
+        'E': {'LPAREN', 'ID'},
+        "E'": {'PLUS'},
+        'T': {'LPAREN', 'ID'},
+        "T'": {'MULT'},
+        'F': {'LPAREN', 'ID'},
+    }
+    
+    FOLLOW = {
+        'E': {'RPAREN', 'EOF'},
+        "E'": {'RPAREN', 'EOF'},
+        'T': {'PLUS', 'RPAREN', 'EOF'},
+        "T'": {'PLUS', 'RPAREN', 'EOF'},
+        'F': {'MULT', 'PLUS', 'RPAREN', 'EOF'},
+    }
+    
+    # Tokens to resynchronize on after an error in each nonterminal
+    SYNC = {
+        'E': FIRST['E'] | FOLLOW['E'],
+        "E'": FIRST["E'"] | FOLLOW["E'"],
+        'T': FIRST['T'] | FOLLOW['T'],
+        "T'": FIRST["T'"] | FOLLOW["T'"],
+        'F': FIRST['F'] | FOLLOW['F'],
+    }
+    
+    def report(self, expected_type=None):
+        """Record a syntax error at the current token"""
+        if self.current_token is not self.error_token:
+            self.error_token = self.current_token
+            self.errors.append(self.error_message(expected_type))
+    
+    def skip_until(self, token_types):
+        """Discard tokens until one of token_types or EOF"""
+        while self.current_token.type != 'EOF' and self.current_token.type not in token_types:
+            # Skipped identifiers still appear in the symbol table
+            self.symbol_table.add_symbol(self.current_token)
+            self.current_token = self.lexer.get_next_token()
+    
+    def parse(self):
+        """Parse the input and return the partial parse tree, whether it was
+        accepted, and the first error message"""
+        # Same expansion as IterativeParser.parse(), except that errors do
+        # not unwind and that a production's leading terminal, when it is the
+        # lookahead, and Ɛ are matched as soon as the production is chosen
+        # instead of going through the stack. Nodes are built inline rather
+        # than through node_builder(), whose call per node is a large part of
+        # the parse time.
+        table = self.PARSE_TABLE
+        build_tree = self.build_tree
+        add_symbol = self.symbol_table.add_symbol
+        get_next_token = self.lexer.get_next_token
+        token = self.current_token
+        self.error_token = None
+        root = None
+        stack = [(None, 'E')]
+        pop = stack.pop
+        push = stack.append
+        
+        while True:
+            while stack:
+                parent, symbol = pop()
+                productions = table.get(symbol)
+                
+                if productions is None:
+                    # A terminal that did not lead its production: RPAREN
+                    if token.type != symbol:
+                        self.current_token = token
+                        self.report(symbol)
+                        self.skip_until((symbol,))
+                        token = self.current_token
+                        if token.type != symbol:
+                            continue
+                    add_symbol(token)
+                    if build_tree:
+                        parent.children.append(Node(symbol, token.value))
+                    token = get_next_token()
+                    continue
+                
+                node = None
+                if build_tree:
+                    node = Node(symbol)
+                    if parent is None:
+                        root = node
+                    else:
+                        parent.children.append(node)
+                
+                production = productions.get(token.type) or productions.get(None)
+                if production is None:
+                    self.current_token = token
+                    self.report("'(' or identifier")
+                    self.skip_until(self.SYNC[symbol])
+                    token = self.current_token
+                    production = productions.get(token.type)
+                    if production is None:
+                        continue
+                
+                first = production[0]
+                if first == 'Ɛ':
+                    if build_tree:
+                        node.children.append(Node('Ɛ'))
+                    continue
+                if first == token.type:
+                    add_symbol(token)
+                    if build_tree:
+                        node.children.append(Node(first, token.value))
+                    token = get_next_token()
+                    production = production[1:]
+                for child_symbol in reversed(production):
+                    push((node, child_symbol))
+            
+            if token.type == 'EOF':
+                break
+            self.current_token = token
+            self.report()
+            self.skip_until(self.FIRST['E'])
+            token = self.current_token
+            if token.type == 'EOF':
+                break
+            push((root, 'E'))
+        
+        self.current_token = token
+        if self.errors:
+            return root, False, self.errors[0]
+        return root, True, None
+
+
+class CompactParser(IterativeParser):
+    """IterativeParser that stores the parse tree in a CompactTree"""
+    def node_builder(self):
+        if not self.build_tree:
+            return _skip_node
+        self.tree = CompactTree()
+        return self.tree.add_node
+    
+    def parse(self):
+        """Parse the input and return the root node of the parse tree."""
+        root, is_accepted, error = super().parse()
+        if root is not None:
+            root = self.tree.node(root)
+        return root, is_accepted, error
+
+
+class ParseDag:
+    """Parse tree with structurally identical subtrees stored once.
+    
+    Nodes are interned bottom-up by name, value and children, so every
+    repeated subexpression such as (a+b)*c becomes one shared Node. Node ids
+    number the distinct subtrees in the order their walk completes, which
+    only depends on the tree. root is an ordinary Node whose to_dict() gives
+    the same result as the original tree's.
+    """
+    def __init__(self, root):
+        self.nodes = []
+        self.child_ids = []
+        self.tree_nodes = 0
+        self.root = self.nodes[self.intern(root)]
+    
+    def intern(self, root):
+        """Intern the subtree at root and return its node id"""
+        ids = {}
+        nodes = self.nodes
+        child_ids = self.child_ids
+        ids_done = []
+        walked = 0
+        # Entries are (node, None) before the children are walked and
+        # (node, child count) after; leaves are interned without either
+        stack = [(root, None)]
+        while stack:
+            node, count = stack.pop()
+            if count is None and node.children:
+                children = node.children
+                stack.append((node, len(children)))
+                stack.extend((child, None) for child in reversed(children))
+                continue
+            
+            walked += 1
+            if count:
+                children = tuple(ids_done[-count:])
+                del ids_done[-count:]
+            else:
+                children = ()
+            key = (node.name, node.value, children)
+            node_id = ids.get(key)
+            if node_id is None:
+                node_id = ids[key] = len(nodes)
+                nodes.append(Node(node.name, node.value, [nodes[child] for child in children]))
+                child_ids.append(children)
+            ids_done.append(node_id)
+        self.tree_nodes += walked
+        return ids_done[0]
+    
+    def to_dict(self):
+        """Return the DAG with each distinct subtree listed once
+        
+        nodes[i] is the node with id i; children are node ids.
+        """
+        return {
+            'root': len(self.nodes) - 1,
+            'nodes': [{'name': node.name, 'value': node.value, 'children': list(children)}
+                      for node, children in zip(self.nodes, self.child_ids)]
+        }
+    
+    def stats(self):
+        return {
+            'tree_nodes': self.tree_nodes,
+            'dag_nodes': len(self.nodes)
+        }
+
+
+# Called by run_analysis() for a per-call recorder of stage timings when set,
+# see instrumentation.enable()
+recorder_factory = None
+
+LEXERS = {
+    'scalar': Lexer,
+    'regex': RegexLexer,
+    'numpy': VectorLexer,
+}
+
+PARSERS = {
+    'recursive': Parser,
+    'iterative': IterativeParser,
+    'compact': CompactParser,
+    'recovering': RecoveringParser,
+}
+
+
+# Result sections an analysis can produce: the token list, the symbol table,
+# the positions of every identifier occurrence, the concrete parse tree, the
+# parse tree with shared subtrees listed once and the abstract syntax tree.
+# Acceptance and errors are always reported; sections left out are not
+# computed at all.
+SECTIONS = ('tokens', 'symbols', 'occurrences', 'cst', 'dag', 'ast')
+DEFAULT_SECTIONS = ('tokens', 'symbols', 'cst')
+
+# Operator precedence in the grammar: T binds MULT tighter than E binds PLUS
+PRECEDENCE = {'PLUS': 1, 'MULT': 2}
+
+
+def build_ast(tokens):
+    """Return the abstract syntax tree of an accepted token list
+    
+    Operators are nodes with their two operands as children, identifiers
+    are leaves, and parentheses, primed nonterminals and Ɛ are left out.
+    Built straight from the tokens, without a parse tree.
+    """
+    operands = []
+    operators = []
+    
+    def reduce():
+        operator = operators.pop()
+        right = operands.pop()
+        left = operands.pop()
+        operands.append(Node(operator.type, operator.value, [left, right]))
+    
+    for token in tokens:
+        kind = token.type
+        if kind == 'ID':
+            operands.append(Node('ID', token.value))
+        elif kind == 'LPAREN':
+            operators.append(token)
+        elif kind == 'RPAREN':
+            while operators[-1].type != 'LPAREN':
+                reduce()
+            operators.pop()
+        else:
+            # Operators of equal precedence associate to the left
+            while (operators and operators[-1].type != 'LPAREN'
+                   and PRECEDENCE[operators[-1].type] >= PRECEDENCE[kind]):
+                reduce()
+            operators.append(token)
+    
+    while operators:
+        reduce()
+    return operands[0]
+
+
+# Character classes of the ASCII input recognize() reads; characters missing
+# here are classified with isalnum()/isspace() like the lexers do
+CHAR_CLASSES = dict.fromkeys(map(chr, range(128)), 'INVALID')
+CHAR_CLASSES.update(dict.fromkeys('abcdefghijklmnopqrstuvwxyz'
+                                  'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789', 'ID'))
+CHAR_CLASSES.update(dict.fromkeys(' \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f', 'SPACE'))
+CHAR_CLASSES.update(TOKEN_TYPES)
+
+
+def recognize(text):
+    """Return whether the grammar accepts text, without tokens or a tree
+    
+    Agrees with lexing and parsing the text on acceptance. The grammar only
+    accepts operands (identifiers or parenthesized expressions) separated by
+    PLUS or MULT, so the characters are read once by a two-state machine,
+    expecting an operand or an operator, and a counter of open parentheses.
+    Nothing is allocated per token.
+    """
+    classes = CHAR_CLASSES
+    expect_operand = True
+    in_identifier = False
+    depth = 0
+    for char in text:
+        kind = classes.get(char)
+        if kind is None:
+            if char.isalnum():
+                kind = 'ID'
+            elif char.isspace():
+                kind = 'SPACE'
+            else:
+                return False
+        
+        if kind == 'ID':
+            if not in_identifier:
+                if not expect_operand:
+                    return False
+                expect_operand = False
+                in_identifier = True
+            continue
+        
+        in_identifier = False
+        if kind == 'SPACE':
+            continue
+        if kind == 'PLUS' or kind == 'MULT':
+            if expect_operand:
+                return False
+            expect_operand = True
+        elif kind == 'LPAREN':
+            if not expect_operand:
+                return False
+            depth += 1
+        elif kind == 'RPAREN':
+            if expect_operand or not depth:
+                return False
+            depth -= 1
+        else:
+            return False
+    
+    return not expect_operand and not depth
+
+
+class Analysis:
+    """Tokens, symbol table and parse tree produced for one expression.
+    
+    tokens is None when lexing failed; error then holds the lexer message.
+    sections lists the parts of the result that were computed.
+    """
+    def __init__(self, text, sections=DEFAULT_SECTIONS):
+        self.text = text
+        self.sections = sections
+        self.tokens = None
+        self.symbol_table = None
+        self.parse_tree = None
+        # ParseDag of the parse tree, with the 'dag' section
+        self.dag = None
+        self.ast = None
+        self.is_accepted = False
+        self.error = None
+        # Every lexer and syntax error, when a recovering parser was used
+        self.errors = None
+        self.recorder = None
+    
+    def to_dict(self):
+        """Return the result dictionary served by the API"""
+        if self.tokens is None:
+            return {
+                'input': self.text,
+                'is_accepted': False,
+                'error': self.error
+            }
+        
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.start('to_dict')
+        
+        result = {'input': self.text}
+        if 'tokens' in self.sections:
+            result['tokens'] = [token.to_dict() for token in self.tokens]
+        result['is_accepted'] = self.is_accepted
+        if 'symbols' in self.sections:
+            result['symbol_table'] = self.symbol_table.get_table()
+        if 'occurrences' in self.sections:
+            result['occurrences'] = self.symbol_table.occurrences()
+        result['error'] = self.error
+        
+        if self.errors is not None:
+            result['errors'] = self.errors
+        
+        if self.parse_tree and 'cst' in self.sections:
+            result['parse_tree'] = self.parse_tree.to_dict()
+        
+        if self.dag:
+            result['parse_dag'] = self.dag.to_dict()
+        
+        if self.ast:
+            result['ast'] = self.ast.to_dict()
+        
+        if recorder is not None:
+            recorder.stop()
+        return result
+
+
+def run_analysis(text, lexer='scalar', parser='iterative', sections=DEFAULT_SECTIONS):
+    """Lex and parse an expression and return its Analysis
+    
+    lexer and parser select the engines by name, see LEXERS and PARSERS.
+    sections selects the result sections, see SECTIONS; without 'cst' the
+    parser only recognizes the input, and the recursive Parser, which
+    always builds a tree, is replaced by IterativeParser. 'occurrences'
+    records identifiers in a ColumnarSymbolTable, and 'dag' replaces the
+    parse tree with its ParseDag.
+    """
+    lexer_class = LEXERS[lexer]
+    parser_class = PARSERS[parser]
+    build_tree = 'cst' in sections or 'dag' in sections
+    if not build_tree and not issubclass(parser_class, IterativeParser):
+        parser_class = IterativeParser
+    analysis = Analysis(text, sections)
+    recorder = recorder_factory() if recorder_factory is not None else None
     try:
-        # Initialize components
-        lexer = Lexer(text)
+        # Lex once and share the token stream with the parser
+        if recorder is not None:
+            recorder.start('lex')
+        if parser_class.recovers:
+            lexer = lexer_class(text, recover=True)
+        else:
+            lexer = lexer_class(text)
         tokens = lexer.tokenize()
         
-        # Re-initialize for parsing
-        lexer = Lexer(text)
-        symbol_table = SymbolTable()
-        parser = Parser(lexer, symbol_table)
+        if recorder is not None:
+            recorder.start('parse')
+        if 'occurrences' in sections:
+            symbol_table = ColumnarSymbolTable()
+        elif 'symbols' in sections:
+            symbol_table = SymbolTable()
+        else:
+            symbol_table = NullSymbolTable()
+        parser = parser_class(lexer.token_stream(), symbol_table)
+        parser.build_tree = build_tree
         
         # Parse the input
-        parse_tree, is_accepted, error = parser.parse()
-        
-        # Prepare results
-        result = {
-            'input': text,
-            'tokens': [token.to_dict() for token in tokens],
-            'is_accepted': is_accepted,
-            'symbol_table': symbol_table.get_table(),
-            'error': error
-        }
+        analysis.parse_tree, analysis.is_accepted, analysis.error = parser.parse()
+        analysis.tokens = tokens
+        analysis.symbol_table = symbol_table
         
-        if parse_tree:
-            result['parse_tree'] = parse_tree.to_dict()
+        if parser.recovers:
+            analysis.errors = lexer.errors + parser.errors
+            if lexer.errors:
+                analysis.is_accepted = False
+                analysis.error = lexer.errors[0]
         
-        return result
+        if 'dag' in sections and analysis.parse_tree:
+            if recorder is not None:
+                recorder.start('dag')
+            # The shared nodes take the place of the tree, which is freed
+            analysis.dag = ParseDag(analysis.parse_tree)
+            analysis.parse_tree = analysis.dag.root
+        
+        if 'ast' in sections and analysis.is_accepted:
+            if recorder is not None:
+                recorder.start('ast')
+            analysis.ast = build_ast(tokens)
     except Exception as e:
-        return {
-            'input': text,
-            'is_accepted': False,
-            'error': str(e)
-        }
+        analysis.error = str(e)
+    
+    if recorder is not None:
+        recorder.stop()
+        recorder.finish(analysis)
+        analysis.recorder = recorder
+    return analysis
+
+
+def analyze_expression(text, lexer='scalar', parser='iterative', sections=DEFAULT_SECTIONS):
+    """Analyze an expression and return structured results"""
+    return run_analysis(text, lexer, parser, sections).to_dict()
 
 
 # Function to test the analyzer with examples
@@ -339,6 +1478,101 @@ def test_analyzer():
     
     return results
 
+# Pieces of the random texts of the checks below: the terminals, whitespace
+# with CRLF, and characters the lexers reject or only accept as non-ASCII
+# letters and digits
+CHECK_PIECES = ('a', 'b', 'x1', '7', 'é', '٣', '+', '*', '(', ')', ' ', '\t', '\n', '\r\n', '$', '-', '\u00a0')
+
+
+def _random_text(rng):
+    # Half are expressions of the grammar with up to one mutated piece,
+    # half arbitrary strings of pieces, most of which are rejected
+    if rng.random() < 0.5:
+        return ''.join(rng.choice(CHECK_PIECES) for _ in range(rng.randint(0, 30)))
+    
+    pieces = []
+    depth = 0
+    for _ in range(rng.randint(1, 12)):
+        while rng.random() < 0.3:
+            pieces.append('(')
+            depth += 1
+        pieces.append(rng.choice(('a', 'b', 'x1', '7', 'é')))
+        while depth and rng.random() < 0.4:
+            pieces.append(')')
+            depth -= 1
+        pieces.append(rng.choice(('+', '*', ' + ', '\n*')))
+    pieces[-1] = ')' * depth
+    if rng.random() < 0.5:
+        pieces[rng.randrange(len(pieces))] = rng.choice(CHECK_PIECES)
+    return ''.join(pieces)
+
+
+def test_recognize(count=200000, seed=0):
+    """Return the random texts on which recognize() and the parser disagree"""
+    import random
+    rng = random.Random(seed)
+    disagreements = []
+    for _ in range(count):
+        text = _random_text(rng)
+        if recognize(text) != run_analysis(text, sections=()).is_accepted:
+            disagreements.append(text)
+    return disagreements
+
+
+def _lexed(lexer_class, text, recover):
+    # The tokens, EOF position and errors of a lexer as comparable values
+    lexer = lexer_class(text, recover=recover)
+    try:
+        tokens = [(token.type, token.value, token.position) for token in lexer.tokenize()]
+    except Exception as e:
+        return str(e)
+    return tokens, lexer.eof_token.position, lexer.errors
+
+
+def test_vector_lexer(count=100000, seed=0):
+    """Return the random texts on which VectorLexer and Lexer disagree,
+    with errors raised and recovered"""
+    import random
+    rng = random.Random(seed)
+    disagreements = []
+    for _ in range(count):
+        text = _random_text(rng)
+        recover = rng.random() < 0.5
+        if _lexed(VectorLexer, text, recover) != _lexed(Lexer, text, recover):
+            disagreements.append(text)
+    return disagreements
+
+
+def _pushed(text, recover, rng):
+    # _lexed() for a PushLexer fed text in random chunks of up to 5
+    # characters, empty ones included, from the tokens feed() returned
+    lexer = PushLexer(recover=recover)
+    tokens = []
+    try:
+        i = 0
+        while i < len(text):
+            j = i + rng.randint(0, 5)
+            tokens.extend(lexer.feed(text[i:j]))
+            i = j
+        tokens.extend(lexer.close())
+    except Exception as e:
+        return str(e)
+    return [(token.type, token.value, token.position) for token in tokens], lexer.eof_token.position, lexer.errors
+
+
+def test_push_lexer(count=100000, seed=0):
+    """Return the random texts on which PushLexer and Lexer disagree, with
+    errors raised and recovered"""
+    import random
+    rng = random.Random(seed)
+    disagreements = []
+    for _ in range(count):
+        text = _random_text(rng)
+        recover = rng.random() < 0.5
+        if _pushed(text, recover, rng) != _lexed(Lexer, text, recover):
+            disagreements.append(text)
+    return disagreements
+
 
 if __name__ == "__main__":
     # Test the analyzer
@@ -349,4 +1583,17 @@ if __name__ == "__main__":
         print(f"\nExpression: {result['input']}")
         print(f"Accepted: {result['is_accepted']}")
         if result['error']:
-            print(f"Error: {result['error']}")
\ No newline at end of file
+            print(f"Error: {result['error']}")
+    
+    # python lexical_analyzer.py check also runs the randomized checks
+    import sys
+    if sys.argv[1:] == ['check']:
+        for check in (test_recognize, test_vector_lexer, test_push_lexer):
+            try:
+                failures = check()
+            except ImportError as e:
+                print(f"\n{check.__name__}: skipped, {e}")
+                continue
+            print(f"\n{check.__name__}: {len(failures)} failures")
+            for failure in failures[:5]:
+                print(f"  {failure!r}")
@@ -0,0 +1,149 @@
+# Load test for the analyzer API
+# Posts expressions to /api/analyze from concurrent client threads and
+# reports latency percentiles, throughput and 429 rejections per concurrency
+# level. Everything runs locally: with --spawn the server is started from
+# serving.py on a free port, otherwise --url points at a running server.
+# Run with: python loadtest.py --spawn [--concurrency 1 8 32] [--requests 2000]
+
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+from workloads import many_lines
+
+
+def percentile(sorted_values, fraction):
+    """Return the value below which the given fraction of values lie"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+def run_level(host, port, bodies, concurrency):
+    """Send every body once from concurrency client threads
+    
+    Returns the elapsed seconds, the latencies of successful requests and a
+    count of responses by status code.
+    """
+    next_index = iter(range(len(bodies)))
+    lock = threading.Lock()
+    latencies = []
+    statuses = {}
+    headers = {'Content-Type': 'application/json'}
+    
+    def client():
+        # One keep-alive connection per client thread
+        connection = http.client.HTTPConnection(host, port, timeout=60)
+        local_latencies = []
+        local_statuses = {}
+        while True:
+            with lock:
+                index = next(next_index, None)
+            if index is None:
+                break
+            start = time.perf_counter()
+            try:
+                connection.request('POST', '/api/analyze', bodies[index], headers)
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection(host, port, timeout=60)
+                status = 'error'
+            elapsed = time.perf_counter() - start
+            local_statuses[status] = local_statuses.get(status, 0) + 1
+            if status == 200:
+                local_latencies.append(elapsed)
+        connection.close()
+        with lock:
+            latencies.extend(local_latencies)
+            for status, count in local_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+    
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, sorted(latencies), statuses
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def spawn_server(port, server_args):
+    """Start serving.py on port and wait until it answers"""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'serving.py')
+    process = subprocess.Popen([sys.executable, script, '--port', str(port)] + server_args)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"serving.py exited with code {process.returncode}")
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            connection.request('GET', '/')
+            connection.getresponse().read()
+            connection.close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("serving.py did not start within 30 seconds")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the analyzer API with a local client')
+    parser.add_argument('--url', default='http://127.0.0.1:8080', help='server to test without --spawn')
+    parser.add_argument('--spawn', action='store_true', help='start serving.py for the test')
+    parser.add_argument('--server-args', default='',
+                        help="extra serving.py arguments with --spawn, e.g. '--workers 4 --queue 16'")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16, 64],
+                        help='client threads per level (default: 1 4 16 64)')
+    parser.add_argument('--requests', type=int, default=2000, help='requests per level (default: 2000)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the generated expressions')
+    args = parser.parse_args()
+    
+    process = None
+    if args.spawn:
+        host, port = '127.0.0.1', free_port()
+        process = spawn_server(port, args.server_args.split())
+    else:
+        url = urlsplit(args.url)
+        host, port = url.hostname, url.port or 80
+    
+    try:
+        print(f"{'concurrency':>11} {'requests':>9} {'ok':>7} {'429':>6} {'other':>6} "
+              f"{'requests/s':>11} {'p50':>10} {'p99':>10}")
+        for level, concurrency in enumerate(args.concurrency):
+            # Fresh expressions per level, so the result cache does not
+            # turn later levels into cache hits
+            expressions = many_lines(args.requests, seed=args.seed + level)
+            bodies = [json.dumps({'expression': expression}) for expression in expressions]
+            elapsed, latencies, statuses = run_level(host, port, bodies, concurrency)
+            ok = statuses.get(200, 0)
+            rejected = statuses.get(429, 0)
+            other = sum(statuses.values()) - ok - rejected
+            print(f"{concurrency:>11} {len(bodies):>9} {ok:>7} {rejected:>6} {other:>6} "
+                  f"{len(bodies) / elapsed:>11.0f} {percentile(latencies, 0.5) * 1000:>7.2f} ms "
+                  f"{percentile(latencies, 0.99) * 1000:>7.2f} ms")
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+# Analysis of expressions that arrive in chunks
+# A PushLexer turns each chunk into tokens as soon as they are complete, and
+# the parser consumes them on its own thread while later chunks are still
+# being received, so parsing a slowly uploaded expression overlaps with the
+# upload instead of starting after it.
+
+import threading
+from queue import SimpleQueue
+
+from lexical_analyzer import (DEFAULT_SECTIONS, PARSERS, Analysis, ColumnarSymbolTable,
+                              IterativeParser, NullSymbolTable, ParseDag, PushLexer, SymbolTable,
+                              Token, build_ast)
+
+
+class QueueTokenStream:
+    """Token stream whose get_next_token() waits for the next fed token"""
+    def __init__(self, queue):
+        self.queue = queue
+        self.eof_token = None
+    
+    def get_next_token(self):
+        if self.eof_token is not None:
+            return self.eof_token
+        token = self.queue.get()
+        if token.type == 'EOF':
+            self.eof_token = token
+        return token
+
+
+class PushAnalyzer:
+    """Analyze one expression fed in chunks with feed() and ended with close()
+    
+    close() returns the same Analysis as run_analysis() of the whole text.
+    parser and sections are as in run_analysis().
+    """
+    def __init__(self, parser='iterative', sections=DEFAULT_SECTIONS):
+        parser_class = PARSERS[parser]
+        build_tree = 'cst' in sections or 'dag' in sections
+        if not build_tree and not issubclass(parser_class, IterativeParser):
+            parser_class = IterativeParser
+        if 'occurrences' in sections:
+            symbol_table = ColumnarSymbolTable()
+        elif 'symbols' in sections:
+            symbol_table = SymbolTable()
+        else:
+            symbol_table = NullSymbolTable()
+        
+        self.sections = sections
+        self.chunks = []
+        self.lexer = PushLexer(recover=parser_class.recovers)
+        self.lexer_error = None
+        self.symbol_table = symbol_table
+        self.queue = SimpleQueue()
+        self.parser = None
+        self.result = None
+        
+        # The parser reads its first token on construction, so it is
+        # created on the thread that waits for tokens
+        def parse():
+            parser = parser_class(QueueTokenStream(self.queue), symbol_table)
+            parser.build_tree = build_tree
+            self.parser = parser
+            self.result = parser.parse()
+        
+        self.thread = threading.Thread(target=parse, name='push-parser', daemon=True)
+        self.thread.start()
+    
+    def feed(self, chunk):
+        """Lex a chunk of the expression and pass its tokens to the parser"""
+        self.chunks.append(chunk)
+        if self.lexer_error is not None:
+            return
+        try:
+            tokens = self.lexer.feed(chunk)
+        except Exception as e:
+            # Lexer errors fail the analysis; the parser is stopped and the
+            # rest of the input is only kept for the result
+            self.lexer_error = str(e)
+            self.queue.put(Token('EOF', None, (self.lexer.line, self.lexer.column)))
+            return
+        for token in tokens:
+            self.queue.put(token)
+    
+    def close(self):
+        """End the input, wait for the parser and return the Analysis"""
+        analysis = Analysis(''.join(self.chunks), self.sections)
+        if self.lexer_error is None:
+            for token in self.lexer.close():
+                self.queue.put(token)
+            self.queue.put(self.lexer.eof_token)
+        self.thread.join()
+        
+        if self.lexer_error is not None:
+            analysis.error = self.lexer_error
+            return analysis
+        
+        lexer = self.lexer
+        parser = self.parser
+        analysis.parse_tree, analysis.is_accepted, analysis.error = self.result
+        analysis.tokens = lexer.tokens
+        analysis.symbol_table = self.symbol_table
+        
+        if parser.recovers:
+            analysis.errors = lexer.errors + parser.errors
+            if lexer.errors:
+                analysis.is_accepted = False
+                analysis.error = lexer.errors[0]
+        
+        if 'dag' in self.sections and analysis.parse_tree:
+            analysis.dag = ParseDag(analysis.parse_tree)
+            analysis.parse_tree = analysis.dag.root
+        
+        if 'ast' in self.sections and analysis.is_accepted:
+            analysis.ast = build_ast(lexer.tokens)
+        return analysis
@@ -0,0 +1,212 @@
+# Persistent result store for batch jobs
+# Keeps analysis results in a SQLite database, keyed by a hash of the
+# expression, together with the progress of named batch jobs: every line of
+# a batch maps to the key of its result. A batch commits its lines in
+# groups, so a job that stops is resumed after the last committed line, and
+# expressions seen before, by any batch, are not analyzed again.
+
+import copy
+import sqlite3
+import threading
+
+from cache import expression_key
+from json_stream import encode_analysis
+from lexical_analyzer import DEFAULT_SECTIONS, run_analysis
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    options TEXT NOT NULL,
+    key BLOB NOT NULL,
+    result BLOB NOT NULL,
+    accepted INTEGER NOT NULL,
+    PRIMARY KEY (options, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS batches (
+    batch_id TEXT PRIMARY KEY,
+    options TEXT NOT NULL,
+    lines INTEGER NOT NULL DEFAULT 0,
+    next_offset INTEGER,
+    done INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS batch_lines (
+    batch_id TEXT NOT NULL,
+    line INTEGER NOT NULL,
+    key BLOB NOT NULL,
+    PRIMARY KEY (batch_id, line)
+) WITHOUT ROWID;
+"""
+
+
+def stored_result(text, parser='iterative', sections=DEFAULT_SECTIONS):
+    """Return (result, is_accepted) of text, result as UTF-8 JSON bytes"""
+    analysis = run_analysis(text, parser=parser, sections=sections)
+    return encode_analysis(analysis).encode('utf-8'), analysis.is_accepted
+
+
+class ResultStore:
+    """SQLite store of analysis results and batch progress at path
+    
+    Results are UTF-8 JSON bytes as from analysis_json(), stored per
+    parser and sections since those change the result. The store can be
+    shared between threads.
+    """
+    def __init__(self, path, parser='iterative', sections=DEFAULT_SECTIONS, commit_every=1000):
+        self.path = path
+        self.parser = parser
+        self.sections = sections
+        self.options = f"{parser}:{','.join(sections)}"
+        self.commit_every = commit_every
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('PRAGMA synchronous=NORMAL')
+            self.connection.executescript(SCHEMA)
+    
+    def view(self, parser, sections):
+        """Return a store on the same database for other analysis options"""
+        store = copy.copy(self)
+        store.parser = parser
+        store.sections = sections
+        store.options = f"{parser}:{','.join(sections)}"
+        return store
+    
+    def close(self):
+        with self.lock:
+            self.connection.close()
+    
+    def get(self, key):
+        """Return the stored (result, is_accepted) for an expression_key(), or None"""
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT result, accepted FROM results WHERE options = ? AND key = ?',
+                (self.options, key)).fetchone()
+        return (row[0], bool(row[1])) if row else None
+    
+    def compute(self, text):
+        """Return stored_result() of text with the store's options"""
+        return stored_result(text, self.parser, self.sections)
+    
+    def analyze_json(self, text, compute=None):
+        """Return the result bytes for text, analyzing and storing it on a miss
+        
+        compute(text) produces (result, is_accepted) on a miss, by default
+        compute() of the store; see ResultCache.analyze_json().
+        """
+        key = expression_key(text)
+        entry = self.get(key)
+        if entry is None:
+            entry = (compute or self.compute)(text)
+            with self.lock, self.connection:
+                self.connection.execute('INSERT OR IGNORE INTO results VALUES (?, ?, ?, ?)',
+                                        (self.options, key) + tuple(entry))
+        return entry[0]
+    
+    def batch(self, batch_id):
+        """Return the progress of a batch as a dict, or None if unknown
+        
+        lines is the number of committed lines and next_offset the position
+        of the input after the last of them, when the input has positions.
+        """
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT options, lines, next_offset, done FROM batches WHERE batch_id = ?',
+                (batch_id,)).fetchone()
+        if row is None:
+            return None
+        options, lines, next_offset, done = row
+        return {'batch_id': batch_id, 'options': options, 'lines': lines,
+                'next_offset': next_offset, 'done': bool(done)}
+    
+    def start_batch(self, batch_id):
+        """Return the progress of a batch, creating it if it is new
+        
+        Raises ValueError for a batch that was started with other options.
+        """
+        with self.lock, self.connection:
+            self.connection.execute('INSERT OR IGNORE INTO batches (batch_id, options) VALUES (?, ?)',
+                                    (batch_id, self.options))
+        progress = self.batch(batch_id)
+        if progress['options'] != self.options:
+            raise ValueError(f"Batch {batch_id!r} was started with options {progress['options']}, "
+                             f"not {self.options}")
+        return progress
+    
+    def batch_results(self, batch_id, start=0, stop=None):
+        """Yield the committed (result, is_accepted) of a batch in line order
+        
+        Only lines start + 1 to stop are returned, all lines by default.
+        Rows are read in pages so that the store stays usable meanwhile.
+        """
+        line = start
+        while stop is None or line < stop:
+            limit = 1000 if stop is None else min(1000, stop - line)
+            with self.lock:
+                rows = self.connection.execute(
+                    'SELECT batch_lines.line, results.result, results.accepted FROM batch_lines '
+                    'JOIN results ON results.options = ? AND results.key = batch_lines.key '
+                    'WHERE batch_lines.batch_id = ? AND batch_lines.line > ? '
+                    'ORDER BY batch_lines.line LIMIT ?',
+                    (self.options, batch_id, line, limit)).fetchall()
+            if not rows:
+                return
+            for line, result, accepted in rows:
+                yield result, bool(accepted)
+    
+    def run_batch(self, batch_id, items, compute=None):
+        """Analyze the (offset, expression) items of a started batch
+        
+        Yields (result, is_accepted) for every item. items continue the batch
+        after its committed lines; offset is the position of the input
+        after the item, or None. Every commit_every lines, their new
+        results, line keys and the offset after the last of them are
+        committed in one transaction. When items are exhausted the batch
+        is marked done.
+        """
+        compute = compute or self.compute
+        line = self.start_batch(batch_id)['lines']
+        results = {}
+        lines = []
+        offset = None
+        done = False
+        try:
+            for offset, expression in items:
+                key = expression_key(expression)
+                entry = results.get(key)
+                if entry is None:
+                    entry = self.get(key)
+                    if entry is None:
+                        entry = results[key] = compute(expression)
+                line += 1
+                lines.append((batch_id, line, key))
+                yield entry
+                
+                if len(lines) >= self.commit_every:
+                    self._commit(batch_id, results, lines, line, offset, False)
+                    results = {}
+                    lines = []
+            done = True
+        finally:
+            # A batch that is stopped early keeps the lines it has yielded
+            self._commit(batch_id, results, lines, line, offset, done)
+    
+    def _commit(self, batch_id, results, lines, line, offset, done):
+        with self.lock, self.connection:
+            self.connection.executemany('INSERT OR IGNORE INTO results VALUES (?, ?, ?, ?)',
+                                        ((self.options, key, result, accepted)
+                                         for key, (result, accepted) in results.items()))
+            self.connection.executemany('INSERT OR REPLACE INTO batch_lines VALUES (?, ?, ?)', lines)
+            if offset is None:
+                self.connection.execute('UPDATE batches SET lines = ?, done = ? WHERE batch_id = ?',
+                                        (line, int(done), batch_id))
+            else:
+                self.connection.execute(
+                    'UPDATE batches SET lines = ?, next_offset = ?, done = ? WHERE batch_id = ?',
+                    (line, offset, int(done), batch_id))
+    
+    def stats(self):
+        """Return the number of stored results and batches"""
+        with self.lock:
+            results = self.connection.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+            batches = self.connection.execute('SELECT COUNT(*) FROM batches').fetchone()[0]
+        return {'results': results, 'batches': batches}
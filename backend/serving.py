@@ -0,0 +1,51 @@
+# Production serving of the analyzer API
+# Runs the Flask app behind the multi-threaded waitress server and installs
+# the bounded WorkerPool that the analysis endpoints run on, so that a
+# burst of requests is turned away with 429 instead of queueing without limit
+# Run with: python serving.py [--port 8080] [--threads 8] [--workers 4]
+
+import argparse
+import os
+
+from worker_pool import WorkerPool
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the analyzer API with waitress')
+    parser.add_argument('--host', default=os.environ.get('HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 8080)))
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('SERVER_THREADS', 8)),
+                        help='request handling threads besides those of queued analyses (default: 8)')
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('ANALYSIS_WORKERS', 0)),
+                        help='analysis workers; 0 means one per CPU')
+    parser.add_argument('--queue', type=int, default=int(os.environ.get('ANALYSIS_QUEUE', 16)),
+                        help='analyses waiting for a worker before requests get 429 (default: 16)')
+    parser.add_argument('--processes', action='store_true',
+                        default=os.environ.get('ANALYSIS_PROCESSES', '').lower() in ('1', 'true', 'yes'),
+                        help='analyze in worker processes instead of threads')
+    parser.add_argument('--connection-limit', type=int, default=int(os.environ.get('CONNECTION_LIMIT', 256)),
+                        help='open connections accepted by the server (default: 256)')
+    args = parser.parse_args()
+    
+    from waitress import serve
+    
+    import app as app_module
+    
+    pool = WorkerPool(args.workers or os.cpu_count() or 1, args.queue, args.processes)
+    app_module.analysis_pool = pool
+    # Waitress runs at most threads requests at a time and queues the others
+    # itself, without a limit. Each analysis admitted by the pool holds a
+    # request thread while it waits, so the server gets one thread per pool
+    # slot on top of --threads; a burst then reaches the pool and gets 429
+    # instead of waiting in the server's queue.
+    threads = args.threads + pool.capacity
+    try:
+        serve(app_module.app, host=args.host, port=args.port, threads=threads,
+              connection_limit=args.connection_limit,
+              max_request_body_size=app_module.app.config['MAX_UPLOAD_BYTES'])
+    finally:
+        pool.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+# Tests of the Flask endpoints through the test client
+
+import io
+import json
+import threading
+
+import pytest
+
+pytest.importorskip('flask')
+
+import app as app_module
+from worker_pool import WorkerPool
+
+EXPRESSIONS = ['a+b', 'x*(y+z)', '3++4', '(a+b)*c']
+
+
+@pytest.fixture
+def client():
+    return app_module.app.test_client()
+
+
+def upload(client, query, lines):
+    body = ('\n'.join(lines) + '\n').encode('utf-8')
+    return client.post(f'/api/analyze-file?{query}', data={'file': (io.BytesIO(body), 'expressions.txt')},
+                       content_type='multipart/form-data')
+
+
+def test_analyze_file_ndjson_streams_every_line(client):
+    # Spread over more than one spool buffer, so the copy goes to disk
+    lines = EXPRESSIONS * 5000
+    response = upload(client, 'format=ndjson', lines)
+    assert response.status_code == 200
+    results = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [result['input'] for result in results] == lines
+    assert [result['is_accepted'] for result in results[:4]] == [True, True, False, True]
+
+
+def test_analyze_file_stream_returns_every_result(client):
+    response = upload(client, 'stream=true', EXPRESSIONS)
+    assert response.status_code == 200
+    results = json.loads(response.get_data(as_text=True))['results']
+    assert [result['input'] for result in results] == EXPRESSIONS
+
+
+class DisconnectingBody(io.RawIOBase):
+    """Request body that fails after its first chunk, like a dropped client"""
+    def __init__(self, chunk):
+        self.chunk = chunk
+    
+    def readable(self):
+        return True
+    
+    def readinto(self, buffer):
+        if self.chunk is None:
+            raise OSError('Client disconnected')
+        size = len(self.chunk)
+        buffer[:size] = self.chunk
+        self.chunk = None
+        return size
+
+
+def test_analyze_stream_ends_parser_thread_when_reading_fails(client):
+    environ = {'wsgi.input': DisconnectingBody(b'a+(b*'), 'CONTENT_LENGTH': '100'}
+    response = client.post('/api/analyze-stream', environ_overrides=environ, content_type='text/plain')
+    assert response.status_code == 400
+    assert 'push-parser' not in [thread.name for thread in threading.enumerate()]
+
+
+@pytest.fixture
+def full_pool(monkeypatch):
+    pool = WorkerPool(1, queue_size=0)
+    monkeypatch.setattr(app_module, 'analysis_pool', pool)
+    pool.acquire()
+    yield pool
+    pool.release()
+    pool.shutdown()
+
+
+def test_every_analysis_path_answers_429_when_the_pool_is_full(client, full_pool):
+    full_pool.release()
+    document_id = client.post('/api/documents', json={'expression': 'a+b'}).get_json()['document_id']
+    full_pool.acquire()
+    
+    responses = [
+        client.post('/api/analyze', json={'expression': 'a+b'}),
+        client.post('/api/analyze?validate=true', json={'expression': 'a+b'}),
+        client.post('/api/analyze?stream=true', json={'expression': 'a+b'}),
+        client.post('/api/analyze-batch', json=EXPRESSIONS),
+        client.post('/api/analyze-batch?validate=true', json=EXPRESSIONS),
+        client.post('/api/analyze-stream', data=b'a+b', content_type='text/plain'),
+        client.post('/api/documents', json={'expression': 'a+b'}),
+        client.post(f'/api/documents/{document_id}/edits', json={'offset': 0, 'deleted': 1, 'inserted': 'c'}),
+        upload(client, '', EXPRESSIONS),
+        upload(client, 'format=ndjson', EXPRESSIONS),
+        upload(client, 'stream=true', EXPRESSIONS),
+    ]
+    assert [response.status_code for response in responses] == [429] * len(responses)
+    assert full_pool.stats()['pending'] == 1
+
+
+def test_streamed_upload_releases_its_pool_slot(client, monkeypatch):
+    pool = WorkerPool(1, queue_size=0)
+    monkeypatch.setattr(app_module, 'analysis_pool', pool)
+    for _ in range(2):
+        response = upload(client, 'format=ndjson', EXPRESSIONS)
+        assert len(response.get_data(as_text=True).splitlines()) == len(EXPRESSIONS)
+        response.close()
+    assert pool.stats()['pending'] == 0
+    pool.shutdown()
+
+
+def test_stateless_deployment_refuses_stateful_endpoints(client, monkeypatch):
+    monkeypatch.setitem(app_module.app.config, 'STATELESS', True)
+    assert client.post('/api/documents', json={'expression': 'a+b'}).status_code == 501
+    assert client.get('/api/trees/abc/nodes/0').status_code == 501
+    assert upload(client, 'batch_id=a', EXPRESSIONS).status_code == 501
+    
+    # The whole tree is returned instead of a tree_id to page it from
+    result = client.post('/api/analyze?tree_depth=1', json={'expression': 'a+b*c'}).get_json()
+    assert 'tree_id' not in result
+    assert result['parse_tree']['children'][0]['children']
+
+
+def test_tree_too_large_to_keep_is_sent_whole(client, monkeypatch):
+    monkeypatch.setattr(app_module.tree_store, 'max_nodes', 0)
+    result = client.post('/api/analyze?tree_depth=1', json={'expression': 'a+b*c'}).get_json()
+    assert 'tree_id' not in result
+    assert result['parse_tree'] == client.post('/api/analyze', json={'expression': 'a+b*c'}).get_json()['parse_tree']
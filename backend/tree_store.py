@@ -0,0 +1,84 @@
+# Parse trees kept for paged retrieval
+# Large parse trees are not sent whole: /api/analyze stores the tree of an
+# analysis as a ParseDag under a tree id and returns a shallow slice of it,
+# and clients fetch the children of the nodes they expand. Stored trees are
+# interned, so the repeated subtrees of a large expression are held once.
+
+import threading
+from collections import OrderedDict, deque
+
+from ids import new_id
+
+
+def tree_slice(dag, node_id, depth=1, max_nodes=1000):
+    """Return the subtree at a node, cut at depth levels below it
+    
+    Nodes are {'id', 'name', 'value', 'child_count'} and have 'children'
+    when they are expanded. With a depth of at least 1 the node's own
+    children are always included; further levels are expanded breadth-first
+    while the slice stays within max_nodes, so a node without 'children'
+    but with a child_count is fetched later by its id. Identical subtrees
+    share one id.
+    """
+    nodes = dag.nodes
+    child_ids = dag.child_ids
+    
+    def entry(i):
+        node = nodes[i]
+        return {'id': i, 'name': node.name, 'value': node.value, 'child_count': len(child_ids[i])}
+    
+    root = entry(node_id)
+    count = 1
+    queue = deque([(root, 0)])
+    while queue:
+        parent, level = queue.popleft()
+        children = child_ids[parent['id']]
+        if level >= depth or (level and count + len(children) > max_nodes):
+            continue
+        parent['children'] = [entry(child) for child in children]
+        count += len(children)
+        queue.extend((child, level + 1) for child in parent['children'])
+    return root
+
+
+class TreeStore:
+    """ParseDags by tree id, keeping the most recently used ones
+    
+    At most max_trees trees and max_nodes interned nodes are kept; the
+    least recently used trees are dropped first.
+    """
+    def __init__(self, max_trees=256, max_nodes=2 ** 22):
+        self.max_trees = max_trees
+        self.max_nodes = max_nodes
+        self.trees = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+    
+    def add(self, dag):
+        """Store a ParseDag and return its tree id, or None if it is too large"""
+        size = len(dag.nodes)
+        if size > self.max_nodes or self.max_trees <= 0:
+            return None
+        
+        tree_id = new_id()
+        with self.lock:
+            self.trees[tree_id] = dag
+            self.size += size
+            while len(self.trees) > self.max_trees or self.size > self.max_nodes:
+                _, evicted = self.trees.popitem(last=False)
+                self.size -= len(evicted.nodes)
+        return tree_id
+    
+    def get(self, tree_id):
+        with self.lock:
+            dag = self.trees.get(tree_id)
+            if dag is not None:
+                self.trees.move_to_end(tree_id)
+            return dag
+    
+    def stats(self):
+        with self.lock:
+            return {
+                'trees': len(self.trees),
+                'nodes': self.size
+            }
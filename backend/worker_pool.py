@@ -0,0 +1,86 @@
+# Bounded pool of analysis workers
+# Used by the analysis endpoints through app.offload() and app.reserved()
+# when serving.py installs one.
+# It lives in its own module so that the app and serving.py share one
+# PoolFull class, also when serving.py runs as __main__.
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+
+class PoolFull(Exception):
+    """Raised when the worker pool has no room for another task"""
+
+
+class WorkerPool:
+    """Runs tasks on workers threads or processes with a bounded queue
+    
+    At most workers + queue_size tasks are accepted at a time; run() raises
+    PoolFull beyond that instead of waiting. Process workers analyze in
+    parallel, but their arguments and results are pickled. Work that has
+    to stay in the calling thread can hold a slot with reserve() instead,
+    so that it counts against the same limit.
+    """
+    def __init__(self, workers, queue_size=64, processes=False):
+        if processes:
+            from concurrent.futures import ProcessPoolExecutor
+            self.executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='analysis')
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self.processes = processes
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+    
+    def run(self, func, *args):
+        """Return func(*args) computed by a worker, or raise PoolFull"""
+        self.acquire()
+        try:
+            future = self.executor.submit(func, *args)
+        except BaseException:
+            self.release(completed=False)
+            raise
+        future.add_done_callback(lambda future: self.release())
+        return future.result()
+    
+    def acquire(self):
+        """Take a task slot for work done outside the workers, or raise PoolFull"""
+        with self.lock:
+            if self.pending >= self.capacity:
+                self.rejected += 1
+                raise PoolFull(f"All {self.workers} workers are busy and {self.capacity - self.workers} tasks are queued")
+            self.pending += 1
+    
+    def release(self, completed=True):
+        """Give back a slot taken by acquire()"""
+        with self.lock:
+            self.pending -= 1
+            if completed:
+                self.completed += 1
+    
+    @contextmanager
+    def reserve(self):
+        """Hold a task slot while the caller does the work itself"""
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+    
+    def stats(self):
+        with self.lock:
+            return {
+                'workers': self.workers,
+                'processes': self.processes,
+                'capacity': self.capacity,
+                'pending': self.pending,
+                'completed': self.completed,
+                'rejected': self.rejected
+            }
+    
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
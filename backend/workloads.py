@@ -0,0 +1,89 @@
+# Deterministic input generators for benchmarks
+# Every generator takes a size and a seed and returns the same inputs for the
+# same arguments, so runs can be compared against a saved baseline
+
+import os
+import random
+import tempfile
+
+IDENTIFIERS = ['a', 'b', 'x1', '7', 'count']
+
+
+def long_expression(terms):
+    """Build a valid expression with the given number of '(a+b)*c' terms"""
+    return '+'.join(['(a+b)*c'] * terms)
+
+
+def random_expression(rng, depth=0):
+    """Build a random valid expression"""
+    choice = rng.random()
+    if depth > 3 or choice < 0.3:
+        return rng.choice(IDENTIFIERS)
+    if choice < 0.45:
+        return '(' + random_expression(rng, depth + 1) + ')'
+    operator = '+' if choice < 0.75 else '*'
+    return random_expression(rng, depth + 1) + operator + random_expression(rng, depth + 1)
+
+
+def flat_sum(terms, seed=0):
+    """One expression adding terms identifiers"""
+    rng = random.Random(seed)
+    return ['+'.join(rng.choice(IDENTIFIERS) for _ in range(terms))]
+
+
+def flat_product(terms, seed=0):
+    """One expression multiplying terms identifiers"""
+    rng = random.Random(seed)
+    return ['*'.join(rng.choice(IDENTIFIERS) for _ in range(terms))]
+
+
+def deep_nesting(depth, seed=0):
+    """One expression nested depth parentheses deep"""
+    return ['(' * depth + 'a' + ')' * depth]
+
+
+def long_identifiers(terms, seed=0, length=200):
+    """One sum of terms identifiers of the given length"""
+    rng = random.Random(seed)
+    letters = 'abcdefghijklmnopqrstuvwxyz0123456789'
+    return [' + '.join(''.join(rng.choice(letters) for _ in range(length)) for _ in range(terms))]
+
+
+def many_lines(lines, seed=0):
+    """Random valid expressions, one per line of an uploaded file"""
+    rng = random.Random(seed)
+    return [random_expression(rng) for _ in range(lines)]
+
+
+def error_heavy(lines, seed=0):
+    """Random expressions of which most are rejected by the parser or lexer"""
+    rng = random.Random(seed)
+    pieces = ['a', 'b', '7', '+', '*', '(', ')', ' ', '++', '**', '()', '$']
+    return [''.join(rng.choice(pieces) for _ in range(rng.randint(1, 20))) for _ in range(lines)]
+
+
+# Workloads of the benchmark suite: generator and size at scale 1
+WORKLOADS = {
+    'flat-sum': (flat_sum, 20000),
+    'flat-product': (flat_product, 20000),
+    'deep-nesting': (deep_nesting, 5000),
+    'long-identifiers': (long_identifiers, 500),
+    'many-lines': (many_lines, 5000),
+    'error-heavy': (error_heavy, 5000),
+}
+
+
+def generate(name, scale=1.0):
+    """Return the expressions of a suite workload at the given scale"""
+    generator, size = WORKLOADS[name]
+    return generator(max(1, int(size * scale)))
+
+
+def expression_file(lines, seed=0):
+    """Write a file of random expressions and return its path"""
+    rng = random.Random(seed)
+    handle, path = tempfile.mkstemp(suffix='.txt')
+    with os.fdopen(handle, 'w') as file:
+        for _ in range(lines):
+            file.write(random_expression(rng) + '\n')
+    return path
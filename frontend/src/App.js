@@ -50,6 +50,10 @@ import theme from "./theme";
 
 const API_URL = "/api";
 const drawerWidth = 240;
+// Longer expressions load only the top of their parse tree, and the rest is
+// fetched as nodes are expanded
+const LAZY_TREE_LENGTH = 2000;
+const LAZY_TREE_DEPTH = 4;
 
 function App() {
   const appTheme = useTheme();
@@ -93,7 +97,15 @@ function App() {
     try {
       let response;
       try {
-        response = await axios.post(`${API_URL}/analyze`, { expression });
+        const params =
+          expression.length > LAZY_TREE_LENGTH
+            ? { tree_depth: LAZY_TREE_DEPTH }
+            : {};
+        response = await axios.post(
+          `${API_URL}/analyze`,
+          { expression },
+          { params }
+        );
       } catch (connectionError) {
         console.warn("Backend connection failed, using mock data");
         await new Promise((resolve) => setTimeout(resolve, 500));
@@ -364,7 +376,11 @@ function App() {
                   )}
                   {tabValue === 2 &&
                     (result.parse_tree ? (
-                      <ParseTreeVisualizer tree={result.parse_tree} />
+                      <ParseTreeVisualizer
+                        tree={result.parse_tree}
+                        treeId={result.tree_id}
+                        onReanalyze={handleAnalyze}
+                      />
                     ) : (
                       <Box sx={{ p: 2, textAlign: "center" }}>
                         <InfoIcon
@@ -7,6 +7,7 @@ import {
   ZoomOut as ZoomOutIcon,
 } from "@mui/icons-material";
 import {
+  Alert,
   Box,
   Button,
   ButtonGroup,
@@ -18,6 +19,7 @@ import {
   Tooltip,
   Typography,
 } from "@mui/material";
+import axios from "axios";
 import html2canvas from "html2canvas";
 import { useEffect, useRef, useState } from "react";
 import Tree from "react-d3-tree";
@@ -25,7 +27,22 @@ import Tree from "react-d3-tree";
 // You'll need to install these dependencies:
 // npm install html2canvas file-saver
 
-const ParseTreeVisualizer = ({ tree }) => {
+const API_URL = "/api";
+// Levels fetched below a node of a lazily loaded tree when it is expanded
+const FETCH_DEPTH = 3;
+
+// Return node with the subtree at path, a dotted list of child indexes,
+// replaced
+const replaceNode = (node, path, replacement) => {
+  if (!path) return replacement;
+  const [index, ...rest] = path.split(".");
+  const children = [...node.children];
+  children[index] = replaceNode(children[index], rest.join("."), replacement);
+  return { ...node, children };
+};
+
+const ParseTreeVisualizer = ({ tree, treeId, onReanalyze }) => {
+  const [treeData, setTreeData] = useState(tree);
   const [dimensions, setDimensions] = useState({ width: 0, height: 0 });
   const containerRef = useRef(null);
   const treeContainerRef = useRef(null);
@@ -34,6 +51,14 @@ const ParseTreeVisualizer = ({ tree }) => {
   const [isDownloading, setIsDownloading] = useState(false);
   const [viewMode, setViewMode] = useState("compact"); // 'compact' or 'expanded'
   const [nodeStats, setNodeStats] = useState({ total: 0, types: {} });
+  // Node whose children are being fetched, and the last failed fetch
+  const [loadingId, setLoadingId] = useState(null);
+  const [loadError, setLoadError] = useState(null);
+
+  useEffect(() => {
+    setTreeData(tree);
+    setLoadError(null);
+  }, [tree]);
 
   useEffect(() => {
     if (containerRef.current) {
@@ -52,14 +77,14 @@ const ParseTreeVisualizer = ({ tree }) => {
     window.addEventListener("resize", handleResize);
 
     // Calculate tree statistics
-    if (tree) {
+    if (treeData) {
       const stats = { total: 0, types: {} };
-      countNodes(tree, stats);
+      countNodes(treeData, stats);
       setNodeStats(stats);
     }
 
     return () => window.removeEventListener("resize", handleResize);
-  }, [tree]);
+  }, [treeData]);
 
   // Helper function to count nodes
   const countNodes = (node, stats) => {
@@ -71,23 +96,69 @@ const ParseTreeVisualizer = ({ tree }) => {
     }
     stats.types[type]++;
 
-    node.children.forEach((child) => countNodes(child, stats));
+    (node.children || []).forEach((child) => countNodes(child, stats));
   };
 
-  const formatTreeData = (node) => {
+  // Lazily loaded trees leave out the children of deeper nodes; they are
+  // fetched by node id and grafted in when the node is clicked. A tree the
+  // server no longer has (or never kept) can only be shown by analyzing
+  // the expression again; other failures can be retried.
+  const loadChildren = async (node) => {
+    if (!treeId) {
+      setLoadError({
+        node,
+        message:
+          "The server did not keep this tree, so its hidden nodes cannot be loaded.",
+        canRetry: false,
+      });
+      return;
+    }
+
+    setLoadError(null);
+    setLoadingId(node.id);
+    try {
+      const response = await axios.get(
+        `${API_URL}/trees/${treeId}/nodes/${node.id}`,
+        { params: { depth: FETCH_DEPTH } }
+      );
+      setTreeData((current) =>
+        replaceNode(current, node.path, response.data.node)
+      );
+    } catch (error) {
+      console.error("Error loading parse tree nodes:", error);
+      const expired = error.response && error.response.status === 404;
+      setLoadError({
+        node,
+        message: expired
+          ? "This tree is no longer on the server, so its hidden nodes cannot be loaded."
+          : "The hidden nodes could not be loaded.",
+        canRetry: !expired,
+      });
+    } finally {
+      setLoadingId(null);
+    }
+  };
+
+  const formatTreeData = (node, path = "") => {
     if (!node) return null;
 
+    const children = node.children || [];
     return {
       name: node.value ? `${node.name}: ${node.value}` : node.name,
-      children: node.children.map((child) => formatTreeData(child)),
+      children: children.map((child, index) =>
+        formatTreeData(child, path ? `${path}.${index}` : `${index}`)
+      ),
       attributes: {
         type: node.name.split(":")[0],
         value: node.value,
+        id: node.id,
+        path,
+        unloaded: !node.children && node.child_count > 0,
       },
     };
   };
 
-  const formattedTree = formatTreeData(tree);
+  const formattedTree = formatTreeData(treeData);
 
   // Custom node rendering
   const renderCustomNodeElement = ({ nodeDatum, toggleNode }) => {
@@ -101,9 +172,15 @@ const ParseTreeVisualizer = ({ tree }) => {
         <circle
           r={nodeSize}
           fill={getNodeColor(nodeDatum.name)}
-          onClick={toggleNode}
+          onClick={
+            nodeDatum.attributes.unloaded
+              ? () => loadChildren(nodeDatum.attributes)
+              : toggleNode
+          }
+          opacity={loadingId === nodeDatum.attributes.id ? 0.5 : 1}
           strokeWidth={2}
           stroke="white"
+          strokeDasharray={nodeDatum.attributes.unloaded ? "4 2" : undefined}
           style={{ cursor: "pointer", transition: "all 0.3s ease" }}
         />
         <text
@@ -352,6 +429,32 @@ const ParseTreeVisualizer = ({ tree }) => {
             {Math.round(zoom * 100)}%
           </Typography>
         </Box>
+
+        {loadError && (
+          <Alert
+            severity="error"
+            onClose={() => setLoadError(null)}
+            action={
+              loadError.canRetry ? (
+                <Button
+                  color="inherit"
+                  size="small"
+                  onClick={() => loadChildren(loadError.node)}
+                >
+                  Retry
+                </Button>
+              ) : (
+                onReanalyze && (
+                  <Button color="inherit" size="small" onClick={onReanalyze}>
+                    Analyze again
+                  </Button>
+                )
+              )
+            }
+          >
+            {loadError.message}
+          </Alert>
+        )}
       </Box>
 
       <Box